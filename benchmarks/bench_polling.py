@@ -0,0 +1,332 @@
+"""Measure what one polling cycle of the integration costs.
+
+Boots a bare Home Assistant, sets up one config entry per fake device with
+all platforms, and then drives update cycles of the real account
+coordinators by hand. Run from the repository root, with Home Assistant
+installed::
+
+    python -m benchmarks.bench_polling --devices 1 10 100 --latency 0.05
+
+With ``--update-source long_poll`` the entries stream changes from the fake
+cloud's long-poll channel instead, and a cycle lasts until every changed
+device has been fetched. ``--local`` gives that fraction of the devices a
+simulated LAN interface, which they are then read through.
+``--sensor-groups`` limits the entity groups the entries enable.
+
+Each row reports the average per cycle of:
+- cloud requests sent
+- executor jobs submitted, and the peak number of executor threads busy at
+  once
+- state writes, and the writes that actually changed a state
+- CPU time of the event loop thread, and wall time
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from homeassistant import bootstrap, config_entries, loader
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant, StateMachine, callback
+from homeassistant.setup import async_setup_component
+
+from .fake_cloud import FakeAquastillaCloud
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "aquastilla_softener"
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Default executor that counts jobs and concurrently busy threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.busy = 0
+        self.peak_busy = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            self.jobs += 1
+        return super().submit(self._track, fn, *args, **kwargs)
+
+    def _track(self, fn, *args, **kwargs):
+        with self._lock:
+            self.busy += 1
+            self.peak_busy = max(self.peak_busy, self.busy)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.busy -= 1
+
+    def reset_peak(self) -> None:
+        with self._lock:
+            self.peak_busy = self.busy
+
+
+@dataclass
+class Result:
+    devices: int
+    cycles: int
+    requests: float
+    executor_jobs: float
+    executor_peak: int
+    cloud_peak: int
+    state_writes: float
+    state_changes: float
+    loop_cpu_ms: float
+    wall_ms: float
+
+    HEADER = (
+        "devices  requests  exec jobs  exec peak  cloud peak  writes  changes  "
+        "loop cpu ms  wall ms"
+    )
+
+    def row(self) -> str:
+        return (
+            f"{self.devices:7d}  {self.requests:8.1f}  {self.executor_jobs:9.1f}  "
+            f"{self.executor_peak:9d}  {self.cloud_peak:10d}  {self.state_writes:6.1f}  "
+            f"{self.state_changes:7.1f}  {self.loop_cpu_ms:11.2f}  {self.wall_ms:7.1f}"
+        )
+
+
+async def _async_start_hass(config_dir: str) -> HomeAssistant:
+    os.symlink(
+        os.path.join(REPO_ROOT, "custom_components"),
+        os.path.join(config_dir, "custom_components"),
+    )
+    if config_dir not in sys.path:
+        sys.path.insert(0, config_dir)
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    if hasattr(loader, "async_setup"):
+        loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await bootstrap.async_load_base_functionality(hass)
+    await async_setup_component(hass, "homeassistant", {})
+    await hass.async_start()
+    return hass
+
+
+async def async_run(
+    devices: int,
+    cycles: int,
+    accounts: int,
+    churn: float,
+    update_source: str,
+    local: float,
+    sensor_groups: Optional[List[str]],
+    cloud: FakeAquastillaCloud,
+) -> Result:
+    loop = asyncio.get_running_loop()
+    executor = CountingExecutor(thread_name_prefix="SyncWorker")
+    loop.set_default_executor(executor)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await _async_start_hass(config_dir)
+
+        # Scheduled refreshes are pushed out of reach; cycles are driven below.
+        options = {
+            "scan_interval_min": 3600,
+            "scan_interval_max": 3600,
+            "update_source": update_source,
+        }
+        if sensor_groups is not None:
+            options["sensor_groups"] = sensor_groups
+        for index, device in enumerate(cloud.devices):
+            data = {
+                "username": f"bench{index % accounts}@example.com",
+                "password": "bench",
+                "device_uuid": device,
+                "api_base_url": cloud.url,
+            }
+            if index < round(local * devices):
+                data["host"], data["port"] = cloud.start_local_device(device["uuid"])
+            entry = config_entries.ConfigEntry(
+                version=1,
+                minor_version=1,
+                domain=DOMAIN,
+                title=device["name"],
+                data=data,
+                options=options,
+                source=config_entries.SOURCE_USER,
+                unique_id=device["uuid"],
+            )
+            await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+        coordinators = list(hass.data[f"{DOMAIN}_accounts"].values())
+
+        state_writes = 0
+        state_changes = 0
+        # StateMachine has __slots__; the method is wrapped on the class.
+        name = (
+            "async_set_internal"
+            if hasattr(StateMachine, "async_set_internal")
+            else "async_set"
+        )
+        async_set = getattr(StateMachine, name)
+
+        def _counting_set(self, *args, **kwargs):
+            nonlocal state_writes
+            state_writes += 1
+            return async_set(self, *args, **kwargs)
+
+        setattr(StateMachine, name, _counting_set)
+
+        @callback
+        def _count_change(event) -> None:
+            nonlocal state_changes
+            state_changes += 1
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, _count_change)
+
+        async def _async_cycle() -> None:
+            await asyncio.gather(*(c.async_refresh() for c in coordinators))
+            await hass.async_block_till_done()
+
+        async def _async_wait(condition) -> None:
+            async with asyncio.timeout(30):
+                while not condition():
+                    await asyncio.sleep(0.01)
+
+        async def _async_pushed_cycle(changed: int) -> None:
+            # Changed devices are fetched once each, locally or from the
+            # cloud; a cloud fetch ends with its settings, fetched or cached.
+            def _fetched() -> int:
+                return (
+                    cloud.requests["/device/{uuid}/settings"]
+                    + sum(c.api.stats.settings_skipped for c in coordinators)
+                    + cloud.requests["local /api/state"]
+                )
+
+            expected = _fetched() + changed
+            await _async_wait(lambda: _fetched() >= expected)
+            await hass.async_block_till_done()
+
+        # The entries' background first refresh is queued behind the request
+        # cap; let it finish so none of its requests are counted.
+        await _async_wait(
+            lambda: not any(c.diagnostics()["pending_devices"] for c in coordinators)
+        )
+        # The first cycle logs in and fills every entity; it is not counted.
+        await _async_cycle()
+        if update_source == "long_poll":
+            await _async_wait(lambda: all(c.streaming for c in coordinators))
+
+        requests = cloud.total_requests
+        jobs = executor.jobs
+        state_writes = state_changes = 0
+        executor.reset_peak()
+        cloud.peak_in_flight = 0
+        cpu = 0.0
+        wall = 0.0
+        for _ in range(cycles):
+            start_cpu = time.thread_time()
+            start_wall = time.perf_counter()
+            changed = cloud.tick(churn)
+            if update_source == "long_poll":
+                await _async_pushed_cycle(changed)
+            else:
+                await _async_cycle()
+            cpu += time.thread_time() - start_cpu
+            wall += time.perf_counter() - start_wall
+
+        result = Result(
+            devices=devices,
+            cycles=cycles,
+            requests=(cloud.total_requests - requests) / cycles,
+            executor_jobs=(executor.jobs - jobs) / cycles,
+            executor_peak=executor.peak_busy,
+            cloud_peak=cloud.peak_in_flight,
+            state_writes=state_writes / cycles,
+            state_changes=state_changes / cycles,
+            loop_cpu_ms=cpu * 1000 / cycles,
+            wall_ms=wall * 1000 / cycles,
+        )
+
+        for entry in hass.config_entries.async_entries(DOMAIN):
+            await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_stop()
+        setattr(StateMachine, name, async_set)
+    executor.shutdown(wait=True)
+    return result
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--devices", type=int, nargs="+", default=[1, 10, 50, 100],
+        help="device counts to benchmark",
+    )
+    parser.add_argument("--cycles", type=int, default=10, help="cycles per run")
+    parser.add_argument(
+        "--accounts", type=int, default=1, help="accounts the devices are spread over",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds added to every request",
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="random extra latency, in seconds",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of requests failing",
+    )
+    parser.add_argument(
+        "--churn", type=float, default=1.0,
+        help="fraction of devices reporting new data each cycle",
+    )
+    parser.add_argument(
+        "--update-source", choices=("polling", "long_poll"), default="polling",
+        help="how the entries learn about new data",
+    )
+    parser.add_argument(
+        "--local", type=float, default=0.0,
+        help="fraction of devices reachable on the simulated LAN",
+    )
+    parser.add_argument(
+        "--sensor-groups", nargs="*", default=None,
+        help="entity groups to enable (default: all)",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    print(Result.HEADER)
+    for devices in args.devices:
+        cloud = FakeAquastillaCloud(
+            devices,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+        cloud.start()
+        try:
+            result = asyncio.run(
+                async_run(
+                    devices,
+                    args.cycles,
+                    min(args.accounts, devices),
+                    args.churn,
+                    args.update_source,
+                    args.local,
+                    args.sensor_groups,
+                    cloud,
+                )
+            )
+        finally:
+            cloud.stop()
+        print(result.row(), flush=True)
+
+
+if __name__ == "__main__":
+    main()
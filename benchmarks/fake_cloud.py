@@ -0,0 +1,329 @@
+"""In-process stand-in for the Aquastilla cloud API.
+
+The server runs on its own thread and event loop, so its CPU time is not
+charged to the Home Assistant event loop being measured.
+"""
+import asyncio
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from aiohttp import web
+
+TOKEN = "fake-token"
+
+
+class FakeAquastillaCloud:
+    """Fake of the endpoints used by the integration.
+
+    ``latency`` (plus up to ``jitter``) seconds are added to every request and
+    a fraction ``error_rate`` of them fails with HTTP 503. Device snapshots
+    only change when :meth:`tick` is called, so unchanged devices return
+    identical data between cycles.
+
+    With ``long_poll`` the account also offers ``GET /device/changes``: it is
+    held until a device changes or ``timeout`` seconds pass (HTTP 204) and
+    returns ``{"cursor": ..., "devices": [uuid, ...]}``. Without it the
+    endpoint answers 404, like a cloud that has no change channel.
+
+    :meth:`start_local_device` additionally serves the LAN interface of a
+    device, with ``local_latency`` per request, backed by the same state.
+    """
+
+    def __init__(
+        self,
+        devices: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        long_poll: bool = True,
+        local_latency: float = 0.002,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.long_poll = long_poll
+        self.local_latency = local_latency
+        self._random = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.errors = 0
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.devices = [
+            {
+                "uuid": f"fake{index:04d}",
+                "serial": f"SN{index:06d}",
+                "name": f"Softener {index}",
+                "model": {"model": "Aquastilla FAKE"},
+                "lastRegeneration": (now - timedelta(days=1)).isoformat(),
+            }
+            for index in range(devices)
+        ]
+        self._state: Dict[str, Dict[str, Any]] = {
+            device["uuid"]: {
+                "timestamp": now,
+                "usage": 0.0,
+                "salt": 80.0,
+                "vacation": False,
+                "flow": True,
+            }
+            for device in self.devices
+        }
+        # Change sequence of the account, and the last change of each device.
+        self._seq = 0
+        self._device_seq = {device["uuid"]: 0 for device in self.devices}
+        self._changed: Optional[asyncio.Event] = None
+        # Requests being handled; a client that gave up on a long poll
+        # leaves its handler running.
+        self._in_flight = 0
+        # Most requests handled at once, for the benchmark to report.
+        self.peak_in_flight = 0
+        self._local_runners: Dict[str, web.AppRunner] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self.url = ""
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def tick(self, churn: float = 1.0) -> int:
+        """Advance a fraction ``churn`` of the devices to a new snapshot.
+
+        Returns the number of devices that changed.
+        """
+        changed = 0
+        for uuid, state in self._state.items():
+            if self._random.random() >= churn:
+                continue
+            state["timestamp"] += timedelta(minutes=1)
+            state["usage"] = round(state["usage"] + 0.002, 3)
+            state["salt"] = max(0.0, state["salt"] - 0.01)
+            self._seq += 1
+            self._device_seq[uuid] = self._seq
+            changed += 1
+        if changed and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._notify)
+        return changed
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def start(self) -> None:
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(started,), name="fake-aquastilla-cloud", daemon=True
+        )
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._async_shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    async def _async_shutdown(self) -> None:
+        # Release held long polls so their handlers finish before cleanup.
+        async with asyncio.timeout(1):
+            while self._in_flight:
+                self._notify()
+                await asyncio.sleep(0.001)
+        for runner in self._local_runners.values():
+            await runner.cleanup()
+        await self._runner.cleanup()
+
+    def _run(self, started: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._changed = asyncio.Event()
+        self._runner = web.AppRunner(self._app())
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.url = "http://127.0.0.1:%d" % self._runner.addresses[0][1]
+        started.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    def _app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/login", self._login)
+        app.router.add_get("/device/all", self._device_all)
+        app.router.add_get("/device/changes", self._device_changes)
+        app.router.add_get("/device/{uuid}/state", self._device_state)
+        app.router.add_get("/device/{uuid}/settings", self._device_settings)
+        app.router.add_post("/device/{uuid}/{command:.+}", self._device_command)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        route = request.match_info.route.resource
+        self.requests[route.canonical if route else request.path] += 1
+        self._in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+        try:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                raise web.HTTPServiceUnavailable()
+            if request.path != "/login" and (
+                request.headers.get("Authorization") != f"Bearer {TOKEN}"
+            ):
+                raise web.HTTPUnauthorized()
+            return await handler(request)
+        finally:
+            self._in_flight -= 1
+
+    def _device(self, request: web.Request) -> Dict[str, Any]:
+        state = self._state.get(request.match_info["uuid"])
+        if state is None:
+            raise web.HTTPNotFound()
+        return state
+
+    async def _login(self, request: web.Request) -> web.Response:
+        expiration = datetime.now(timezone.utc) + timedelta(days=1)
+        return web.json_response({"jwt": TOKEN, "expirationDate": expiration.isoformat()})
+
+    async def _device_all(self, request: web.Request) -> web.Response:
+        return web.json_response(self.devices)
+
+    async def _device_changes(self, request: web.Request) -> web.Response:
+        if not self.long_poll:
+            raise web.HTTPNotFound()
+        since = request.query.get("since")
+        if since is None:
+            return web.json_response({"cursor": str(self._seq), "devices": []})
+        since = int(since)
+        if self._seq <= since:
+            changed = self._changed
+            try:
+                await asyncio.wait_for(
+                    changed.wait(), float(request.query.get("timeout", 30))
+                )
+            except asyncio.TimeoutError:
+                return web.Response(status=204)
+        return web.json_response(
+            {
+                "cursor": str(self._seq),
+                "devices": [
+                    uuid for uuid, seq in self._device_seq.items() if seq > since
+                ],
+            }
+        )
+
+    def _state_payload(self, uuid: str) -> Dict[str, Any]:
+        state = self._state[uuid]
+        timestamp = state["timestamp"]
+        return {
+            "timestamp": timestamp.isoformat(),
+            "uuid": uuid,
+            "state": "deviceStateSoftening",
+            "saltPercent": round(state["salt"]),
+            "saltDays": 40,
+            "saltDaysMax": 60,
+            "waterLeft": 1.2,
+            "waterLeftMax": 2.0,
+            "currentWaterUsage": 0.0,
+            "todayWaterUsage": state["usage"],
+            "expectedRegenerationDate": (timestamp + timedelta(days=2)).isoformat(),
+            "regenPercentage": 0,
+            "firmwareUpdatePercentage": 0,
+            "isOnline": True,
+            "isUpdate": False,
+        }
+
+    def _settings_payload(self, uuid: str) -> Dict[str, Any]:
+        state = self._state[uuid]
+        return {
+            "timezone": "Europe/Warsaw",
+            "vacationMode": state["vacation"],
+            "waterFlow": state["flow"],
+            "serviceMode": False,
+            "waterHardness": 20,
+            "saltAlarmSettings": {"minimumSaltLevelPerDays": 5},
+            "floodAlarmSettings": {
+                "continuousFlowTime": 30,
+                "threshold": 100,
+                "maxFlow": 50,
+            },
+            "unitOfVolume": "l",
+            "waterHardnessUnit": "dH",
+            "serviceModeEndingTime": state["timestamp"].isoformat(),
+        }
+
+    def _apply_command(self, uuid: str, command: str, body: str) -> None:
+        state = self._state[uuid]
+        if command == "vacation_mode":
+            state["vacation"] = body == "1"
+        elif command == "water_flow":
+            state["flow"] = False
+        self._seq += 1
+        self._device_seq[uuid] = self._seq
+        self._notify()
+
+    async def _device_state(self, request: web.Request) -> web.Response:
+        self._device(request)
+        return web.json_response(self._state_payload(request.match_info["uuid"]))
+
+    async def _device_settings(self, request: web.Request) -> web.Response:
+        self._device(request)
+        return web.json_response(self._settings_payload(request.match_info["uuid"]))
+
+    async def _device_command(self, request: web.Request) -> web.Response:
+        self._device(request)
+        self._apply_command(
+            request.match_info["uuid"], request.match_info["command"], await request.text()
+        )
+        return web.Response(text="")
+
+    # Simulated local interface of a softener on the LAN.
+
+    def start_local_device(self, uuid: str) -> Tuple[str, int]:
+        """Serve the local interface of one device; returns its host and port."""
+        return asyncio.run_coroutine_threadsafe(
+            self._async_start_local_device(uuid), self._loop
+        ).result()
+
+    def stop_local_device(self, uuid: str) -> None:
+        """Take a device off the network."""
+        runner = self._local_runners.pop(uuid)
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), self._loop).result()
+
+    async def _async_start_local_device(self, uuid: str) -> Tuple[str, int]:
+        app = web.Application(middlewares=[self._local_middleware])
+        app["uuid"] = uuid
+        app.router.add_get("/api/state", self._local_state)
+        app.router.add_post("/api/{command}", self._local_command)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        self._local_runners[uuid] = runner
+        return runner.addresses[0][:2]
+
+    @web.middleware
+    async def _local_middleware(self, request: web.Request, handler):
+        self.requests[f"local {request.path}"] += 1
+        if self.local_latency:
+            await asyncio.sleep(self.local_latency)
+        return await handler(request)
+
+    async def _local_state(self, request: web.Request) -> web.Response:
+        uuid = request.app["uuid"]
+        return web.json_response(
+            {"state": self._state_payload(uuid), "settings": self._settings_payload(uuid)}
+        )
+
+    async def _local_command(self, request: web.Request) -> web.Response:
+        self._apply_command(
+            request.app["uuid"], request.match_info["command"], await request.text()
+        )
+        return web.Response(text="")
@@ -1,45 +1,260 @@
 import logging
-import asyncio
+from typing import Any, Mapping, Optional
 from homeassistant import config_entries, core
-from aquastilla_softener import AquastillaSoftener
-from .const import DOMAIN
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from .api import AquastillaSoftenerApi, token_store
+from .const import (
+    DOMAIN,
+    DATA_ACCOUNTS,
+    DATA_SCHEDULER,
+    CONF_USERNAME,
+    CONF_PASSWORD,
+    CONF_DEVICE,
+    CONF_HOST,
+    CONF_PORT,
+    DEFAULT_LOCAL_PORT,
+    CONF_API_BASE_URL,
+    API_BASE_URL,
+    CONF_CONNECT_TIMEOUT,
+    CONF_READ_TIMEOUT,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    CONF_SENSOR_GROUPS,
+    DEFAULT_SENSOR_GROUPS,
+    CONF_SCAN_INTERVAL_MAX,
+    DEFAULT_SCAN_INTERVAL_MAX,
+    SIGNAL_SENSOR_GROUPS_UPDATED,
+)
+from .coordinator import AquastillaSoftenerCoordinator
+from .forecast import AquastillaSoftenerForecast
+from .history import AquastillaSoftenerHistory
+from .leak import AquastillaSoftenerLeakResponder
+from .regeneration import AquastillaSoftenerRegenerationTracker
+from .scheduler import AquastillaSoftenerScheduler
+from .services import async_setup_services
+from .local import AquastillaSoftenerFailoverTransport, AquastillaSoftenerLocalApi
+from .transport import AquastillaSoftenerTransport
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+PLATFORMS = ["sensor", "binary_sensor", "switch", "button"]
+
+# Entry settings that need a new client, and so a reload, when they change.
+# A new password from reauthentication is handed to the running client.
+RELOAD_KEYS = (CONF_USERNAME, CONF_API_BASE_URL, CONF_DEVICE)
+# AquastillaSoftenerData fields the history, forecast and regeneration
+# tracker read.
+RECORD_FIELDS = (
+    "timestamp",
+    "state",
+    "today_water_usage",
+    "water_available",
+    "salt_level_percent",
+    "expected_regeneration_date",
+    "max_water_capacity",
+)
+
+
+def _device_transport(
+    hass: core.HomeAssistant,
+    config: Mapping[str, Any],
+    api: AquastillaSoftenerApi,
+) -> Optional[AquastillaSoftenerTransport]:
+    """Return the LAN transport of a device with a host, None for cloud only."""
+    if not config.get(CONF_HOST):
+        return None
+    # Reads and commands go to the softener on the LAN while it answers.
+    return AquastillaSoftenerFailoverTransport(
+        AquastillaSoftenerLocalApi(
+            async_get_clientsession(hass),
+            config[CONF_HOST],
+            config.get(CONF_PORT, DEFAULT_LOCAL_PORT),
+        ),
+        api,
+    )
+
+
+async def async_setup(hass: core.HomeAssistant, config: dict) -> bool:
+    # Staggers the polls of all accounts and caps their requests in flight.
+    hass.data[DATA_SCHEDULER] = AquastillaSoftenerScheduler()
+    async_setup_services(hass)
+    return True
+
+
 async def async_setup_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
 ) -> bool:
     hass.data.setdefault(DOMAIN, {})
     hass_data = dict(entry.data)
+    if entry.options:
+        hass_data.update(entry.options)
+
+    # One client and one coordinator per account, shared by every entry
+    # (device) of that account and by every platform.
+    accounts = hass.data.setdefault(DATA_ACCOUNTS, {})
+    username = hass_data[CONF_USERNAME]
+    coordinator = accounts.get(username)
+    if coordinator is None:
+        coordinator = AquastillaSoftenerCoordinator(
+            hass,
+            AquastillaSoftenerApi(
+                async_get_clientsession(hass),
+                username,
+                hass_data[CONF_PASSWORD],
+                api_base_url=hass_data.get(CONF_API_BASE_URL, API_BASE_URL),
+                # Holds the token the config flow logged in with, so the
+                # first setup needs no login of its own.
+                token_store=token_store(hass, username),
+                connect_timeout=hass_data.get(CONF_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT),
+                read_timeout=hass_data.get(CONF_READ_TIMEOUT, DEFAULT_READ_TIMEOUT),
+                request_limiter=hass.data[DATA_SCHEDULER],
+            ),
+            hass.data[DATA_SCHEDULER],
+        )
+        accounts[username] = coordinator
+    hass_data["unsub_device"] = coordinator.async_add_device(
+        hass_data[CONF_DEVICE],
+        entry.options,
+        _device_transport(hass, hass_data, coordinator.api),
+    )
+    hass_data["coordinator"] = coordinator
+
+    device = hass_data[CONF_DEVICE]
+    history = AquastillaSoftenerHistory(
+        hass,
+        device,
+        entry.options.get(CONF_SCAN_INTERVAL_MAX, DEFAULT_SCAN_INTERVAL_MAX),
+    )
+    await history.async_load()
+    hass_data["history"] = history
+    forecast = AquastillaSoftenerForecast(hass, device)
+    await forecast.async_load()
+    hass_data["forecast"] = forecast
+    regeneration = AquastillaSoftenerRegenerationTracker(hass, device)
+    await regeneration.async_load()
+    hass_data["regeneration"] = regeneration
+
+    # Registered before the platforms so entities read fresh estimates.
+    @core.callback
+    def _async_record_device() -> None:
+        data = coordinator.device_data(device["uuid"])
+        if coordinator.device_changed(device["uuid"], ("timestamp",)):
+            history.async_append(data)
+            forecast.async_update(data)
+        if coordinator.device_changed(device["uuid"], ("timestamp", "state")):
+            regeneration.async_update(data)
+
+    entry.async_on_unload(coordinator.async_add_listener(_async_record_device))
+    entry.async_on_unload(
+        coordinator.async_subscribe_fields(device["uuid"], RECORD_FIELDS)
+    )
+
+    leak = AquastillaSoftenerLeakResponder(hass, coordinator, device)
+    leak.async_set_options(entry.options)
+    entry.async_on_unload(leak.async_stop)
+    hass_data["leak"] = leak
 
     unsub_options_update_listener = entry.add_update_listener(options_update_listener)
     hass_data["unsub_options_update_listener"] = unsub_options_update_listener
     hass.data[DOMAIN][entry.entry_id] = hass_data
 
-    await hass.config_entries.async_forward_entry_setups(entry, ["sensor", "binary_sensor", "switch", "button"])
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    # Entities start from their restored state; fetch live data off the
+    # startup path.
+    entry.async_create_background_task(
+        hass, coordinator.async_first_refresh(), f"{DOMAIN} first refresh"
+    )
 
     return True
 
 
+@core.callback
+def _async_release_account(hass: core.HomeAssistant, username: str) -> None:
+    """Drop an account coordinator once its last device is gone."""
+    accounts = hass.data[DATA_ACCOUNTS]
+    coordinator = accounts.get(username)
+    if coordinator is not None and not coordinator.devices:
+        accounts.pop(username)
+        hass.async_create_task(coordinator.async_shutdown())
+
+
 async def options_update_listener(
     hass: core.HomeAssistant, config_entry: config_entries.ConfigEntry
 ):
-    await hass.config_entries.async_reload(config_entry.entry_id)
+    """Apply changed options and a moved host to the running integration.
+
+    Intervals, the update source, timeouts, sensor groups, leak detection,
+    the local address and a password from reauthentication take effect
+    without a reload. Only a different account or cloud reloads the entry,
+    since it needs a fresh client.
+    """
+    hass_data = hass.data[DOMAIN][config_entry.entry_id]
+    config = {**config_entry.data, **config_entry.options}
+    if any(config.get(key) != hass_data.get(key) for key in RELOAD_KEYS):
+        await hass.config_entries.async_reload(config_entry.entry_id)
+        return
+
+    coordinator: AquastillaSoftenerCoordinator = hass_data["coordinator"]
+    uuid = config[CONF_DEVICE]["uuid"]
+    # Every entry of the account gets the new password; the first one
+    # applies it.
+    coordinator.async_set_password(config[CONF_PASSWORD])
+    if any(config.get(key) != hass_data.get(key) for key in (CONF_HOST, CONF_PORT)):
+        coordinator.async_set_transport(
+            uuid, _device_transport(hass, config, coordinator.api)
+        )
+    # The client is shared by the account; the last entry changed sets it.
+    coordinator.api.set_timeouts(
+        config.get(CONF_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT),
+        config.get(CONF_READ_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    )
+    coordinator.async_set_device_options(uuid, config_entry.options)
+    hass_data["leak"].async_set_options(config_entry.options)
+    groups = hass_data.get(CONF_SENSOR_GROUPS, DEFAULT_SENSOR_GROUPS)
+    for key in (CONF_HOST, CONF_PORT):
+        hass_data.pop(key, None)
+    hass_data.update(config)
+    if config.get(CONF_SENSOR_GROUPS, DEFAULT_SENSOR_GROUPS) != groups:
+        async_dispatcher_send(
+            hass, SIGNAL_SENSOR_GROUPS_UPDATED.format(config_entry.entry_id)
+        )
 
 
 async def async_unload_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
 ) -> bool:
-    unload_ok = all(await asyncio.gather(
-        hass.config_entries.async_forward_entry_unload(entry, "sensor"),
-        hass.config_entries.async_forward_entry_unload(entry, "binary_sensor"),
-        hass.config_entries.async_forward_entry_unload(entry, "switch"),
-        hass.config_entries.async_forward_entry_unload(entry, "button"),
-    ))
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
     hass.data[DOMAIN][entry.entry_id]["unsub_options_update_listener"]()
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        hass_data = hass.data[DOMAIN].pop(entry.entry_id)
+        hass_data["unsub_device"]()
+        # Written now so a reload starts from the latest state, and no
+        # delayed save is left to recreate the files of a removed entry.
+        await hass_data["history"].async_save()
+        await hass_data["forecast"].async_save()
+        await hass_data["regeneration"].async_save()
+        _async_release_account(hass, hass_data[CONF_USERNAME])
 
     return unload_ok
+
+
+async def async_remove_entry(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> None:
+    username = entry.data[CONF_USERNAME]
+    # The token is shared by every entry of the account.
+    if not any(
+        other.entry_id != entry.entry_id and other.data.get(CONF_USERNAME) == username
+        for other in hass.config_entries.async_entries(DOMAIN)
+    ):
+        await token_store(hass, username).async_remove()
+    await AquastillaSoftenerHistory(hass, entry.data[CONF_DEVICE]).async_remove()
+    await AquastillaSoftenerForecast(hass, entry.data[CONF_DEVICE]).async_remove()
+    await AquastillaSoftenerRegenerationTracker(hass, entry.data[CONF_DEVICE]).async_remove()
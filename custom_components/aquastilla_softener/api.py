@@ -0,0 +1,492 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Collection, Dict, Optional, Tuple
+
+import aiohttp
+from aquastilla_softener import AquastillaSoftenerData, AquastillaSoftenerState
+from homeassistant import core
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import (
+    DOMAIN,
+    API_BASE_URL,
+    USER_AGENT,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    TOKEN_STORAGE_VERSION,
+)
+from .transport import AquastillaSoftenerTransport
+
+# Log in again this long before the cached token expires.
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# Most recent request latencies kept for percentiles.
+LATENCY_WINDOW = 256
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AquastillaSoftenerApiError(Exception):
+    """Raised when the Aquastilla cloud returns an error."""
+
+
+class AquastillaSoftenerAuthError(AquastillaSoftenerApiError):
+    """Raised when the Aquastilla cloud rejects the credentials."""
+
+
+class AquastillaSoftenerRateLimitError(AquastillaSoftenerApiError):
+    """Raised when the Aquastilla cloud throttles requests."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AquastillaSoftenerConnectionError(AquastillaSoftenerApiError):
+    """Raised when the Aquastilla cloud cannot be reached."""
+
+
+class AquastillaSoftenerNotFoundError(AquastillaSoftenerApiError):
+    """Raised when the Aquastilla cloud does not know the requested endpoint."""
+
+
+class AquastillaSoftenerRequestStats:
+    """Request, failure and latency counters.
+
+    Recording a request is two additions and a bounded deque append, so it is
+    cheap enough to stay on for every request. Percentiles are only worked
+    out when read.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failures = 0
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, started: float, ok: bool) -> None:
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+        self.latencies.append(time.monotonic() - started)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Return a latency percentile, in seconds, over the recent requests."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_p50": self.latency_percentile(50),
+            "latency_p95": self.latency_percentile(95),
+            "latency_samples": len(self.latencies),
+        }
+
+
+class AquastillaSoftenerApiStats(AquastillaSoftenerRequestStats):
+    """Counters of the cloud traffic of one client."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.logins = 0
+        # Settings fetches answered from the cache instead
+        self.settings_skipped = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **super().as_dict(),
+            "logins": self.logins,
+            "settings_skipped": self.settings_skipped,
+        }
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def token_store(hass: core.HomeAssistant, username: str) -> Store:
+    """Return the store caching the auth token of an Aquastilla account."""
+    return Store(
+        hass,
+        TOKEN_STORAGE_VERSION,
+        f"{DOMAIN}.{slugify(username)}_token",
+        private=True,
+    )
+
+
+def _localize(value: str, tz) -> datetime:
+    # The cloud reports local wall-clock time with a bogus UTC offset.
+    return datetime.fromisoformat(value.replace("+00:00", "")).replace(tzinfo=tz)
+
+
+# AquastillaSoftenerData fields served by the settings endpoint.
+SETTINGS_FIELDS = frozenset(
+    {
+        "vacation_mode",
+        "water_flow",
+        "service_mode",
+        "water_hardness",
+        "minimum_salt_level_per_days",
+        "flood_continuous_flow_time",
+        "flood_threshold",
+        "flood_max_flow",
+        "unit_of_volume",
+        "water_hardness_unit",
+        "service_mode_ending_time",
+    }
+)
+# Seconds cached settings may stand in for a fetch when no caller needs them.
+SETTINGS_MAX_AGE = 3600
+
+
+def parse_device_data(
+    device: Dict, data: Dict[str, Any], data_settings: Dict[str, Any]
+) -> AquastillaSoftenerData:
+    """Build AquastillaSoftenerData from the state and settings payloads."""
+    tz = dt_util.get_time_zone(data_settings["timezone"])
+    last_regeneration_raw = (
+        (device.get("deviceHistory") or {}).get("regeneration")
+        or device.get("lastRegeneration")
+    )
+    return AquastillaSoftenerData(
+        timestamp=_localize(data["timestamp"], tz),
+        uuid=data["uuid"],
+        model=device["model"]["model"],
+        state=AquastillaSoftenerState(data["state"]),
+        salt_level_percent=data["saltPercent"],
+        salt_days_remaining=data["saltDays"],
+        water_available=data["waterLeft"],
+        max_water_capacity=data["waterLeftMax"],
+        expected_regeneration_date=_localize(data["expectedRegenerationDate"], tz),
+        current_water_usage=data["currentWaterUsage"],
+        today_water_usage=data["todayWaterUsage"],
+        last_regeneration=(
+            _localize(last_regeneration_raw, tz) if last_regeneration_raw else None
+        ),
+        is_online=data["isOnline"],
+        is_update=data["isUpdate"],
+        vacation_mode=data_settings["vacationMode"],
+        water_flow=data_settings["waterFlow"],
+        service_mode=data_settings["serviceMode"],
+        salt_days_max=data["saltDaysMax"],
+        regen_percentage=data["regenPercentage"],
+        firmware_upgrade_percentage=data["firmwareUpdatePercentage"],
+        water_hardness=data_settings["waterHardness"],
+        minimum_salt_level_per_days=data_settings["saltAlarmSettings"]["minimumSaltLevelPerDays"],
+        flood_continuous_flow_time=data_settings["floodAlarmSettings"]["continuousFlowTime"],
+        flood_threshold=data_settings["floodAlarmSettings"]["threshold"],
+        flood_max_flow=data_settings["floodAlarmSettings"]["maxFlow"],
+        unit_of_volume=data_settings["unitOfVolume"],
+        water_hardness_unit=data_settings["waterHardnessUnit"],
+        service_mode_ending_time=_localize(data_settings["serviceModeEndingTime"], tz),
+    )
+
+
+class AquastillaSoftenerApi(AquastillaSoftenerTransport):
+    """Asyncio client for the Aquastilla cloud.
+
+    Mirrors the blocking ``aquastilla_softener.AquastillaSoftener`` client but
+    runs on the event loop over a shared, keep-alive aiohttp session.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        email: str,
+        password: str,
+        api_base_url: str = API_BASE_URL,
+        token_store: Optional[Store] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        request_limiter: Optional[contextlib.AbstractAsyncContextManager] = None,
+    ):
+        self._session = session
+        self._email = email
+        self._password = password
+        self._api_base_url = api_base_url
+        self._token: Optional[str] = None
+        self._token_expiration: Optional[datetime] = None
+        self._token_store = token_store
+        self._token_loaded = token_store is None
+        self._login_lock = asyncio.Lock()
+        # Entered around every request except long polls and closing the
+        # valve; shared by all clients of the integration to cap the
+        # requests open at once.
+        self._request_limiter = request_limiter or contextlib.nullcontext()
+        # Last settings payload of each device, with its monotonic fetch time
+        self._settings: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.stats = AquastillaSoftenerApiStats()
+        self.set_timeouts(connect_timeout, read_timeout)
+
+    def set_timeouts(self, connect_timeout: float, read_timeout: float) -> None:
+        """Bound every request by a connect and a read timeout.
+
+        The total per request is capped at their sum, so a hung connection
+        can never hold a caller longer than that.
+        """
+        self._timeout = aiohttp.ClientTimeout(
+            total=connect_timeout + read_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+
+    @property
+    def timeout(self) -> aiohttp.ClientTimeout:
+        return self._timeout
+
+    @property
+    def username(self) -> str:
+        return self._email
+
+    def set_password(self, password: str) -> bool:
+        """Log in with a new password from now on.
+
+        The token in memory is dropped and the next request reads the token
+        store again, where the reauth flow that checked the password left a
+        fresh one. Returns False if ``password`` is the current one.
+        """
+        if password == self._password:
+            return False
+        self._password = password
+        self._token = None
+        self._token_loaded = self._token_store is None
+        return True
+
+    def _token_valid(self) -> bool:
+        if self._token is None:
+            return False
+        if self._token_expiration is None:
+            return True
+        return datetime.now(timezone.utc) < self._token_expiration - TOKEN_REFRESH_MARGIN
+
+    async def _load_token(self) -> None:
+        self._token_loaded = True
+        stored = await self._token_store.async_load()
+        if not stored or stored.get("email") != self._email:
+            return
+        self._token = stored["token"]
+        self._token_expiration = datetime.fromisoformat(stored["expiration"])
+        _LOGGER.debug("Loaded cached token valid until %s", self._token_expiration)
+
+    async def _check_token(
+        self, rejected_token: Optional[str] = None, limit: bool = True
+    ) -> None:
+        """Make sure a usable token is available.
+
+        Logins are single-flight: concurrent callers wait on the same login
+        instead of each posting credentials. ``rejected_token`` is the token a
+        request just got a 401 for; it is only replaced if no other caller has
+        done so in the meantime. ``limit=False`` logs in outside the request
+        limit, for a request that is itself exempt from it.
+        """
+        if rejected_token is None and self._token_loaded and self._token_valid():
+            return
+        async with self._login_lock:
+            if not self._token_loaded:
+                await self._load_token()
+            if rejected_token is not None and self._token == rejected_token:
+                self._token = None
+            if not self._token_valid():
+                await self._update_token(limit)
+
+    async def login(self) -> None:
+        """Log in with the password, even if a valid token is cached.
+
+        Checks the password itself, which a cached token would skip; the
+        new token replaces the stored one.
+        """
+        async with self._login_lock:
+            self._token_loaded = True
+            await self._update_token()
+
+    async def _update_token(self, limit: bool = True) -> None:
+        self.stats.logins += 1
+        async with self._request_limiter if limit else contextlib.nullcontext():
+            started = time.monotonic()
+            try:
+                async with self._session.post(
+                    f"{self._api_base_url}/login",
+                    json={"emailOrPhone": self._email, "password": self._password},
+                    headers={"User-Agent": USER_AGENT},
+                    timeout=self._timeout,
+                ) as response:
+                    self.stats.record(started, response.status == 200)
+                    if response.status == 429:
+                        raise AquastillaSoftenerRateLimitError(
+                            "Login rate limited", _retry_after(response)
+                        )
+                    if response.status >= 500:
+                        raise AquastillaSoftenerApiError(
+                            f"Login failed: {response.status} - {await response.text()}"
+                        )
+                    if response.status != 200:
+                        raise AquastillaSoftenerAuthError(
+                            f"Authentication failed: {await response.text()}"
+                        )
+                    response_data = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                self.stats.record(started, False)
+                raise AquastillaSoftenerConnectionError(f"Login failed: {err!r}") from err
+        self._token = response_data["jwt"]
+        self._token_expiration = datetime.fromisoformat(
+            response_data["expirationDate"]
+        ).replace(tzinfo=timezone.utc)
+        if self._token_store is not None:
+            await self._token_store.async_save(
+                {
+                    "email": self._email,
+                    "token": self._token,
+                    "expiration": self._token_expiration.isoformat(),
+                }
+            )
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        data: Optional[str] = None,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        track: bool = True,
+        limit: bool = True,
+    ) -> Any:
+        """Send an authenticated request.
+
+        ``track=False`` keeps the request out of ``stats``, for long polls:
+        their duration says nothing about cloud latency. ``limit=False``
+        sends it without waiting for a slot under the request limit, for
+        long polls, which would hold one for minutes, and for closing the
+        valve, which must not queue behind polls.
+        """
+        await self._check_token(limit=limit)
+        limiter = self._request_limiter if limit else contextlib.nullcontext()
+        headers = {"User-Agent": USER_AGENT}
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            token = self._token
+            headers["Authorization"] = f"Bearer {token}"
+            async with limiter:
+                started = time.monotonic()
+                try:
+                    async with self._session.request(
+                        method,
+                        f"{self._api_base_url}{path}",
+                        data=data,
+                        params=params,
+                        headers=headers,
+                        timeout=timeout or self._timeout,
+                    ) as response:
+                        if track:
+                            self.stats.record(started, response.status in (200, 204))
+                        if response.status == 401 and attempt == 0:
+                            _LOGGER.debug("Token rejected for %s %s, logging in again", method, path)
+                        elif response.status == 401:
+                            raise AquastillaSoftenerAuthError(f"{method} {path} unauthorized")
+                        elif response.status == 429:
+                            raise AquastillaSoftenerRateLimitError(
+                                f"{method} {path} rate limited", _retry_after(response)
+                            )
+                        elif response.status in (404, 405):
+                            raise AquastillaSoftenerNotFoundError(f"{method} {path} not found")
+                        elif response.status == 204:
+                            return None
+                        elif response.status != 200:
+                            raise AquastillaSoftenerApiError(
+                                f"{method} {path} failed: {response.status} - {await response.text()}"
+                            )
+                        elif method == "GET":
+                            return await response.json(content_type=None)
+                        else:
+                            return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    if track:
+                        self.stats.record(started, False)
+                    raise AquastillaSoftenerConnectionError(
+                        f"{method} {path} failed: {err!r}"
+                    ) from err
+            await self._check_token(rejected_token=token, limit=limit)
+
+    async def list_devices(self) -> list[Dict]:
+        return await self._request("GET", "/device/all")
+
+    async def get_device_data(
+        self, device: Dict, fields: Optional[Collection[str]] = None
+    ) -> AquastillaSoftenerData:
+        """Fetch the state and settings of a device.
+
+        The settings endpoint is skipped when none of ``fields`` comes from
+        it and settings younger than ``SETTINGS_MAX_AGE`` are cached. Those
+        still supply the timezone and fill in the settings fields.
+        """
+        uuid = device["uuid"]
+        data = await self._request("GET", f"/device/{uuid}/state")
+        cached = self._settings.get(uuid)
+        if (
+            fields is None
+            or not SETTINGS_FIELDS.isdisjoint(fields)
+            or cached is None
+            or time.monotonic() - cached[0] > SETTINGS_MAX_AGE
+        ):
+            data_settings = await self._request("GET", f"/device/{uuid}/settings")
+            self._settings[uuid] = (time.monotonic(), data_settings)
+        else:
+            data_settings = cached[1]
+            self.stats.settings_skipped += 1
+        return parse_device_data(device, data, data_settings)
+
+    async def wait_for_changes(
+        self, cursor: Optional[str], timeout: float
+    ) -> Dict[str, Any]:
+        """Long-poll the account for devices with new data.
+
+        The cloud holds the request for up to ``timeout`` seconds and answers
+        as soon as any device changes, with ``{"cursor": ..., "devices":
+        [uuid, ...]}``. Without a cursor it answers at once with the current
+        one. Raises ``AquastillaSoftenerNotFoundError`` if the cloud has no
+        such channel.
+        """
+        params = {"timeout": str(int(timeout))}
+        if cursor is not None:
+            params["since"] = cursor
+        response = await self._request(
+            "GET",
+            "/device/changes",
+            params=params,
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                connect=self._timeout.connect,
+                sock_read=timeout + self._timeout.sock_read,
+            ),
+            track=False,
+            limit=False,
+        )
+        if response is None:
+            return {"cursor": cursor, "devices": []}
+        return response
+
+    async def close_water_valve(self, device: Dict) -> None:
+        await self._request(
+            "POST", f"/device/{device['uuid']}/water_flow", str(0), limit=False
+        )
+
+    async def postpone_regeneration(self, device: Dict) -> None:
+        await self._request("POST", f"/device/{device['uuid']}/delay_regeneration", "")
+
+    async def force_regeneration(self, device: Dict) -> None:
+        await self._request(
+            "POST", f"/device/{device['uuid']}/vacation_mode/force_regeneration", ""
+        )
+
+    async def set_vacation_mode(self, device: Dict, value: int) -> None:
+        await self._request("POST", f"/device/{device['uuid']}/vacation_mode", str(value))
@@ -1,35 +1,45 @@
-from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
+from dataclasses import dataclass
 import logging
-from typing import Optional
-from homeassistant.helpers.device_registry import DeviceInfo
+from typing import Callable, Optional
 from homeassistant.components.binary_sensor import (
     BinarySensorEntity,
     BinarySensorEntityDescription,
     BinarySensorDeviceClass
 )
-from homeassistant.helpers.update_coordinator import (
-    DataUpdateCoordinator,
-    UpdateFailed,
-    CoordinatorEntity,
-)
 
-from homeassistant.core import callback
-from aquastilla_softener import (
-    AquastillaSoftener,
-    AquastillaSoftenerData,
-    AquastillaSoftenerState,
-)
+from homeassistant.helpers.restore_state import RestoreEntity
+from aquastilla_softener import AquastillaSoftenerData
 
 from homeassistant import config_entries, core
-from homeassistant.const import PERCENTAGE, UnitOfVolume
+from homeassistant.const import STATE_OFF, STATE_ON
 
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE
+from .const import DOMAIN, CONF_DEVICE, SENSOR_GROUP_FIRMWARE
 from .coordinator import AquastillaSoftenerCoordinator
+from .entity import (
+    AquastillaSoftenerEntity,
+    AquastillaSoftenerEntityDescription,
+    async_add_group_entities,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
-UPDATE_INTERVAL = timedelta(minutes=1)
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerBinarySensorEntityDescription(
+    BinarySensorEntityDescription, AquastillaSoftenerEntityDescription
+):
+    value_fn: Callable[[AquastillaSoftenerData], Optional[bool]]
+
+
+BINARY_SENSOR_DESCRIPTIONS = (
+    AquastillaSoftenerBinarySensorEntityDescription(
+        key="IS_ONLINE", translation_key="is_online", device_class=BinarySensorDeviceClass.CONNECTIVITY,
+        fields=("is_online",), value_fn=lambda data: data.is_online),
+    AquastillaSoftenerBinarySensorEntityDescription(
+        key="IS_UPDATE", translation_key="is_update", icon="mdi:water",
+        group=SENSOR_GROUP_FIRMWARE, fields=("is_update",), value_fn=lambda data: data.is_update),
+)
+
 
 async def async_setup_entry(
     hass: core.HomeAssistant,
@@ -37,79 +47,29 @@ async def async_setup_entry(
     async_add_entities,
 ):
     config = hass.data[DOMAIN][config_entry.entry_id]
-    if config_entry.options:
-        config.update(config_entry.options)
-
     device = config[CONF_DEVICE]
+    coordinator: AquastillaSoftenerCoordinator = config["coordinator"]
 
-    coordinator = AquastillaSoftenerCoordinator(
+    async_add_group_entities(
         hass,
-        AquastillaSoftener(
-            config[CONF_USERNAME], config[CONF_PASSWORD]
-        ),
-        device,
+        config_entry,
+        "binary_sensor",
+        async_add_entities,
+        BINARY_SENSOR_DESCRIPTIONS,
+        lambda description: AquastillaSoftenerBinarySensor(coordinator, device, description),
     )
 
-    await coordinator.async_config_entry_first_refresh()
-    
-    binary_sensors = [
-        clz(coordinator, device, entity_description)
-        for clz, entity_description in (
-            (AquastillaSoftenerIsOnlineBinarySensor, BinarySensorEntityDescription(
-                key="IS_ONLINE", translation_key="is_online", device_class=BinarySensorDeviceClass.CONNECTIVITY)),
-            (AquastillaSoftenerIsUpdateBinarySensor, BinarySensorEntityDescription(
-                key="IS_UPDATE", translation_key="is_update", icon="mdi:water")),
-        )
-    ]
-
-    async_add_entities(binary_sensors)
 
-
-class AquastillaSoftenerBinarySensor(BinarySensorEntity, CoordinatorEntity, ABC):
-    def __init__(
-        self,
-        coordinator: AquastillaSoftenerCoordinator,
-        device: dict,
-        entity_description: BinarySensorEntityDescription = None,
-    ):
-        super().__init__(coordinator)
-        self.entity_description = entity_description
-        self._device = device
-        self._attr_unique_id = f"{device['uuid']}_{entity_description.key}"
-        self._attr_has_entity_name = True
+class AquastillaSoftenerBinarySensor(AquastillaSoftenerEntity, BinarySensorEntity, RestoreEntity):
+    entity_description: AquastillaSoftenerBinarySensorEntityDescription
 
     async def async_added_to_hass(self) -> None:
         await super().async_added_to_hass()
+        if self.coordinator.device_data(self._device["uuid"]) is None:
+            last_state = await self.async_get_last_state()
+            if last_state is not None and last_state.state in (STATE_ON, STATE_OFF):
+                self._attr_is_on = last_state.state == STATE_ON
         self._handle_coordinator_update()
 
-    @property
-    def device_info(self) -> Optional[DeviceInfo]:
-        device = self.coordinator._device
-        if isinstance(device, dict):
-            return DeviceInfo(
-                identifiers={(DOMAIN, device["uuid"])},
-                name=device["model"]["model"],
-                serial_number=device["serial"],
-                model=device["model"]["model"],
-            )
-        return None
-
-    @callback
-    def _handle_coordinator_update(self) -> None:
-        self.update(self.coordinator.data)
-        self.async_write_ha_state()
-
-    @abstractmethod
-    def update(self, data: AquastillaSoftenerData):
-        ...
-
-
-class AquastillaSoftenerIsOnlineBinarySensor(AquastillaSoftenerBinarySensor):
     def update(self, data: AquastillaSoftenerData):
-        self._attr_is_on = data.is_online
-
-
-class AquastillaSoftenerIsUpdateBinarySensor(AquastillaSoftenerBinarySensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_is_on = data.is_update
-
+        self._attr_is_on = self.entity_description.value_fn(data)
@@ -1,38 +1,59 @@
+from dataclasses import dataclass
 import logging
-from datetime import timedelta
 from typing import Optional
 
-from homeassistant.helpers.entity import EntityCategory
-from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.components.button import ButtonEntity, ButtonEntityDescription
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from aquastilla_softener import AquastillaSoftener
+from homeassistant.core import callback
+
 from homeassistant import config_entries, core
 
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE
+from .commands import (
+    COMMAND_CLOSE_VALVE,
+    COMMAND_FORCE_REGENERATION,
+    COMMAND_POSTPONE_REGENERATION,
+)
+from .const import DOMAIN, CONF_DEVICE, SENSOR_GROUP_CONTROLS
 from .coordinator import AquastillaSoftenerCoordinator
+from .entity import (
+    AquastillaSoftenerEntity,
+    AquastillaSoftenerEntityDescription,
+    async_add_group_entities,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerButtonEntityDescription(
+    ButtonEntityDescription, AquastillaSoftenerEntityDescription
+):
+    # Command sent when the button is pressed
+    command: str
+    group: Optional[str] = SENSOR_GROUP_CONTROLS
+
+
 BUTTON_DESCRIPTIONS = [
-    ButtonEntityDescription(
+    AquastillaSoftenerButtonEntityDescription(
         key="force_regen",
         translation_key="force_regen",
         name="Force Regeneration",
         icon="mdi:refresh",
+        command=COMMAND_FORCE_REGENERATION,
     ),
-    ButtonEntityDescription(
+    AquastillaSoftenerButtonEntityDescription(
         key="close_valve",
         translation_key="close_valve",
         name="Close valve",
         icon="mdi:valve-closed",
+        command=COMMAND_CLOSE_VALVE,
     ),
-    ButtonEntityDescription(
+    AquastillaSoftenerButtonEntityDescription(
         key="postpone_regen",
         translation_key="postpone_regeneration",
         name="Postpone regeneration",
         icon="mdi:clock-plus",
+        command=COMMAND_POSTPONE_REGENERATION,
     ),
 ]
 
@@ -43,58 +64,50 @@ async def async_setup_entry(
     async_add_entities,
 ):
     config = hass.data[DOMAIN][config_entry.entry_id]
-    if config_entry.options:
-        config.update(config_entry.options)
+    coordinator: AquastillaSoftenerCoordinator = config["coordinator"]
 
     device = config[CONF_DEVICE]
 
-    coordinator = AquastillaSoftenerCoordinator(
+    async_add_group_entities(
         hass,
-        AquastillaSoftener(
-            config[CONF_USERNAME], config[CONF_PASSWORD]
-        ),
-        device,
+        config_entry,
+        "button",
+        async_add_entities,
+        BUTTON_DESCRIPTIONS,
+        lambda description: AquastillaSoftenerButton(coordinator, device, description),
     )
 
-    await coordinator.async_config_entry_first_refresh()
-
-    buttons = [
-        AquastillaSoftenerButton(coordinator, description)
-        for description in BUTTON_DESCRIPTIONS
-    ]
-
-    async_add_entities(buttons)
 
+class AquastillaSoftenerButton(AquastillaSoftenerEntity, ButtonEntity):
+    entity_description: AquastillaSoftenerButtonEntityDescription
 
-class AquastillaSoftenerButton(CoordinatorEntity, ButtonEntity):
     def __init__(
         self,
         coordinator: AquastillaSoftenerCoordinator,
-        description: ButtonEntityDescription,
+        device: dict,
+        description: AquastillaSoftenerButtonEntityDescription,
     ):
-        super().__init__(coordinator)
-        self.entity_description = description
-        self._attr_unique_id = f"{DOMAIN}_{description.key}_{coordinator._device['uuid']}"
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, coordinator._device["uuid"])},
-            "name": coordinator._device["name"],
-        }
-        self._attr_has_entity_name = True
+        super().__init__(coordinator, device, description)
+        # Buttons predate the shared id scheme; keep their registry entries.
+        self._attr_unique_id = f"{DOMAIN}_{description.key}_{device['uuid']}"
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # A button has no state of its own; only availability can change.
+        available = self.available
+        if available == self._last_available:
+            return
+        self._last_available = available
+        self.async_write_ha_state()
+        self.coordinator.state_writes += 1
 
     async def async_press(self) -> None:
-        softener = self.coordinator.api
-        device = self.coordinator._device
+        command = self.entity_description.command
 
         try:
-            if self.entity_description.key == "force_regen":
-                await self.hass.async_add_executor_job(softener.force_regeneration, device)
-                _LOGGER.info("Triggered regeneration")
-            elif self.entity_description.key == "close_valve":
-                await self.hass.async_add_executor_job(softener.close_water_valve, device)
-                _LOGGER.info("Closed valve")
-            elif self.entity_description.key == "postpone_regen":
-                await self.hass.async_add_executor_job(softener.postpone_regeneration, device)
-                _LOGGER.info("Postponed regeneration")
+            # Queued per device: repeated presses merge into one command.
+            await self.coordinator.async_send_command(self._device["uuid"], command)
+            _LOGGER.info("Sent %s to %s", command, self._device["uuid"])
         except Exception as e:
             _LOGGER.error("Error handling button press %s: %s", self.entity_description.key, e)
 
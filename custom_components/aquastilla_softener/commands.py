@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from homeassistant.core import callback
+
+from .api import AquastillaSoftenerRateLimitError, AquastillaSoftenerRequestStats
+from .const import DOMAIN
+
+if TYPE_CHECKING:
+    from .coordinator import AquastillaSoftenerCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Commands are named after the transport methods that send them.
+COMMAND_CLOSE_VALVE = "close_water_valve"
+COMMAND_FORCE_REGENERATION = "force_regeneration"
+COMMAND_POSTPONE_REGENERATION = "postpone_regeneration"
+COMMAND_SET_VACATION_MODE = "set_vacation_mode"
+
+# Commands that jump the queue and are never held back by the rate limit.
+SAFETY_COMMANDS = frozenset({COMMAND_CLOSE_VALVE})
+# Token bucket per device: commands sent back to back, and seconds to earn
+# another one.
+COMMAND_BURST = 3
+COMMAND_REFILL = 10
+
+
+class AquastillaSoftenerTokenBucket:
+    """Allow ``burst`` commands at once and one per ``refill`` seconds after."""
+
+    def __init__(self, burst: int = COMMAND_BURST, refill: float = COMMAND_REFILL):
+        self._burst = burst
+        self._refill = refill
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _top_up(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) / self._refill)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Return the seconds until a token is available."""
+        self._top_up()
+        wait = max(0.0, (1 - self._tokens) * self._refill)
+        return max(wait, self._paused_until - time.monotonic())
+
+    def take(self) -> None:
+        # Safety commands take a token without waiting; never go into debt.
+        self._top_up()
+        self._tokens = max(0.0, self._tokens - 1)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every command back, for when the cloud asks to slow down."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AquastillaSoftenerCommandStats(AquastillaSoftenerRequestStats):
+    """Command counters; latencies run from queueing to completion."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.coalesced = 0
+        self.depth = 0
+        self.max_depth = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **super().as_dict(),
+            "coalesced": self.coalesced,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+        }
+
+
+class _PendingCommand:
+    def __init__(self, args: tuple) -> None:
+        self.args = args
+        self.queued = time.monotonic()
+        self.waiters: List[asyncio.Future] = []
+
+
+class AquastillaSoftenerCommandQueue:
+    """Send the commands of one device one at a time.
+
+    A command that is already waiting absorbs new requests for it: callers
+    share its outcome, and a setter sends only the last value it was given.
+    Safety commands such as closing the valve go ahead of everything else
+    and skip the rate limit; the rest are ordered by arrival and paced by a
+    token bucket. A command that is being sent is not merged with, since the
+    device may have changed in the meantime.
+    """
+
+    def __init__(self, coordinator: "AquastillaSoftenerCoordinator", device: dict):
+        self._coordinator = coordinator
+        self._device = device
+        self._bucket = AquastillaSoftenerTokenBucket()
+        self._heap: List[tuple[int, int, str]] = []
+        self._pending: Dict[str, _PendingCommand] = {}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[], None]] = []
+        self.stats = AquastillaSoftenerCommandStats()
+
+    @callback
+    def async_add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Call ``listener`` whenever the queue depth or stats change."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    @callback
+    def _async_notify(self) -> None:
+        self.stats.depth = len(self._pending)
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+        for listener in list(self._listeners):
+            listener()
+
+    async def async_send(self, command: str, *args: Any) -> None:
+        """Queue ``command`` and wait until it has been sent."""
+        pending = self._pending.get(command)
+        if pending is None:
+            pending = self._pending[command] = _PendingCommand(args)
+            priority = 0 if command in SAFETY_COMMANDS else 1
+            heapq.heappush(self._heap, (priority, next(self._seq), command))
+        else:
+            self.stats.coalesced += 1
+            pending.args = args
+        waiter = self._coordinator.hass.loop.create_future()
+        pending.waiters.append(waiter)
+        self._async_notify()
+        self._wake.set()
+        if self._task is None:
+            self._task = self._coordinator.hass.async_create_background_task(
+                self._async_run(), f"{DOMAIN} commands {self._device['uuid']}"
+            )
+        await waiter
+
+    @callback
+    def async_shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for pending in self._pending.values():
+            for waiter in pending.waiters:
+                waiter.cancel()
+        self._pending.clear()
+        self._heap.clear()
+
+    async def _async_run(self) -> None:
+        try:
+            while self._heap:
+                command = self._heap[0][2]
+                if command not in SAFETY_COMMANDS:
+                    wait = self._bucket.wait_time()
+                    if wait > 0:
+                        # Woken early when a safety command is queued.
+                        self._wake.clear()
+                        try:
+                            await asyncio.wait_for(self._wake.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+                heapq.heappop(self._heap)
+                pending = self._pending.pop(command)
+                self._bucket.take()
+                await self._async_execute(command, pending)
+                self._async_notify()
+        finally:
+            self._task = None
+
+    async def _async_execute(self, command: str, pending: _PendingCommand) -> None:
+        transport = self._coordinator.transport(self._device["uuid"])
+        try:
+            await getattr(transport, command)(self._device, *pending.args)
+        except Exception as err:
+            self.stats.record(pending.queued, False)
+            if isinstance(err, AquastillaSoftenerRateLimitError) and err.retry_after:
+                self._bucket.pause(err.retry_after)
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_exception(err)
+            return
+        self.stats.record(pending.queued, True)
+        _LOGGER.debug(
+            "Sent %s to %s after %.2fs (%d request(s) merged)",
+            command,
+            self._device["uuid"],
+            time.monotonic() - pending.queued,
+            len(pending.waiters),
+        )
+        for waiter in pending.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
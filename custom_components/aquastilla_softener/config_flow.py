@@ -1,13 +1,60 @@
 import logging
-from typing import Any, Dict, Optional
-from .sensor import async_setup_entry
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional
 
 from homeassistant import config_entries
 from homeassistant import core
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.selector import (
+    EntitySelector,
+    EntitySelectorConfig,
+    SelectSelector,
+    SelectSelectorConfig,
+    SelectSelectorMode,
+)
 import voluptuous as vol
 
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE
-from aquastilla_softener import AquastillaSoftener
+from .api import (
+    AquastillaSoftenerApi,
+    AquastillaSoftenerApiError,
+    AquastillaSoftenerAuthError,
+    token_store,
+)
+from .const import (
+    DOMAIN,
+    CONF_USERNAME,
+    CONF_PASSWORD,
+    CONF_API_BASE_URL,
+    API_BASE_URL,
+    CONF_DEVICE,
+    CONF_HOST,
+    CONF_PORT,
+    DEFAULT_LOCAL_PORT,
+    CONF_SCAN_INTERVAL_MIN,
+    CONF_SCAN_INTERVAL_MAX,
+    DEFAULT_SCAN_INTERVAL_MIN,
+    DEFAULT_SCAN_INTERVAL_MAX,
+    CONF_CONNECT_TIMEOUT,
+    CONF_READ_TIMEOUT,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    CONF_UPDATE_SOURCE,
+    DEFAULT_UPDATE_SOURCE,
+    UPDATE_SOURCE_POLLING,
+    UPDATE_SOURCE_LONG_POLL,
+    CONF_SENSOR_GROUPS,
+    DEFAULT_SENSOR_GROUPS,
+    SENSOR_GROUPS,
+    CONF_LEAK_SENSORS,
+    CONF_LEAK_MAX_FLOW,
+    CONF_LEAK_FLOW_MINUTES,
+    DEFAULT_LEAK_MAX_FLOW,
+    DEFAULT_LEAK_FLOW_MINUTES,
+)
+
+from .local import AquastillaSoftenerLocalApi
+
+if TYPE_CHECKING:
+    from homeassistant.components.zeroconf import ZeroconfServiceInfo
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +72,41 @@ class AquastillaSoftenerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     def __init__(self):
         self.data: Optional[Dict[str, Any]] = None
         self.devices = []
+        self._device: Optional[Dict[str, Any]] = None
+        self._discovered_uuid: Optional[str] = None
+        self._discovered_host: Optional[str] = None
+        self._discovered_port: Optional[int] = None
+        self._reauth_entry: Optional[config_entries.ConfigEntry] = None
+
+    @staticmethod
+    @core.callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry):
+        return AquastillaSoftenerOptionsFlow(config_entry)
+
+    async def async_step_zeroconf(self, discovery_info: "ZeroconfServiceInfo"):
+        """Handle a softener announcing its local interface on the LAN."""
+        uuid = discovery_info.properties.get("uuid")
+        if not uuid:
+            return self.async_abort(reason="not_aquastilla_device")
+        await self.async_set_unique_id(uuid)
+        port = discovery_info.port or DEFAULT_LOCAL_PORT
+        # A softener reached over the LAN that moved to a new address is
+        # updated; the entry's update listener switches it over without a
+        # reload. Entries set up for the cloud only are left alone.
+        entry = self.hass.config_entries.async_entry_for_domain_unique_id(DOMAIN, uuid)
+        self._abort_if_unique_id_configured(
+            updates=(
+                {CONF_HOST: discovery_info.host, CONF_PORT: port}
+                if entry is not None and entry.data.get(CONF_HOST)
+                else None
+            ),
+            reload_on_update=False,
+        )
+        self._discovered_uuid = uuid
+        self._discovered_host = discovery_info.host
+        self._discovered_port = port
+        self.context["title_placeholders"] = {"host": discovery_info.host}
+        return await self.async_step_user()
 
     async def async_step_user(self, user_input: Optional[Dict[str, Any]] = None):
         """Handle user authentication step."""
@@ -34,21 +116,30 @@ class AquastillaSoftenerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             email = user_input[CONF_USERNAME]
             password = user_input[CONF_PASSWORD]
 
-            # Validate credentials and fetch devices
+            # Validate credentials and fetch devices. The token lands in the
+            # account's token store, where the entry's setup picks it up.
             try:
-                softener = AquastillaSoftener(email=email, password=password)
-                self.devices = await self.hass.async_add_executor_job(softener.list_devices)
-
+                softener = AquastillaSoftenerApi(
+                    async_get_clientsession(self.hass),
+                    email,
+                    password,
+                    token_store=token_store(self.hass, email),
+                )
+                await softener.login()
+                self.devices = await softener.list_devices()
+            except AquastillaSoftenerAuthError as e:
+                _LOGGER.warning("Authentication failed: %s", e)
+                errors["base"] = "auth_failed"
+            except AquastillaSoftenerApiError as e:
+                _LOGGER.warning("Could not reach the Aquastilla cloud: %s", e)
+                errors["base"] = "cannot_connect"
+            else:
                 if not self.devices:
                     errors["base"] = "no_devices"
                 else:
                     self.data = user_input
                     return await self.async_step_select_device()
 
-            except Exception as e:
-                _LOGGER.error("Authentication failed: %s", e)
-                errors["base"] = "auth_failed"
-
         return self.async_show_form(
             step_id="user", data_schema=DATA_SCHEMA_USER, errors=errors
         )
@@ -66,10 +157,8 @@ class AquastillaSoftenerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             if selected_device:
                 await self.async_set_unique_id(selected_uuid)
                 self._abort_if_unique_id_configured()
-                return self.async_create_entry(
-                    title=f"{selected_device['model']['model']}",
-                    data={**self.data, CONF_DEVICE: selected_device},
-                )
+                self._device = selected_device
+                return await self.async_step_local()
 
             errors["base"] = "device_not_found"
 
@@ -81,7 +170,201 @@ class AquastillaSoftenerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         return self.async_show_form(
             step_id="select_device",
-            data_schema=vol.Schema({vol.Required(CONF_DEVICE): vol.In(device_choices)}),
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_DEVICE, default=self.unique_id): vol.In(
+                        device_choices
+                    )
+                }
+                if self.unique_id in device_choices
+                else {vol.Required(CONF_DEVICE): vol.In(device_choices)}
+            ),
+            errors=errors,
+        )
+
+    async def async_step_local(self, user_input: Optional[Dict[str, Any]] = None):
+        """Optionally reach the softener on the LAN, with the cloud as fallback."""
+        errors: Dict[str, str] = {}
+        data = {**self.data, CONF_DEVICE: self._device}
+        # The discovered address is only offered for the softener behind it.
+        discovered = self._device["uuid"] == self._discovered_uuid
+
+        if user_input is not None:
+            host = user_input.get(CONF_HOST, "").strip()
+            if not host:
+                return self.async_create_entry(
+                    title=f"{self._device['model']['model']}", data=data
+                )
+            port = user_input.get(CONF_PORT, DEFAULT_LOCAL_PORT)
+            try:
+                local_data = await AquastillaSoftenerLocalApi(
+                    async_get_clientsession(self.hass), host, port
+                ).get_device_data(self._device)
+            except (AquastillaSoftenerApiError, KeyError, ValueError) as e:
+                _LOGGER.warning("Softener not reachable at %s:%s: %s", host, port, e)
+                errors["base"] = "cannot_connect_local"
+            else:
+                if local_data.uuid == self._device["uuid"]:
+                    return self.async_create_entry(
+                        title=f"{self._device['model']['model']}",
+                        data={**data, CONF_HOST: host, CONF_PORT: port},
+                    )
+                # Another softener on the LAN would be read, and its valve
+                # closed, in place of this one.
+                _LOGGER.warning(
+                    "Softener %s answered at %s:%s instead of %s",
+                    local_data.uuid,
+                    host,
+                    port,
+                    self._device["uuid"],
+                )
+                errors["base"] = "wrong_device"
+
+        return self.async_show_form(
+            step_id="local",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_HOST,
+                        description={
+                            "suggested_value": self._discovered_host if discovered else None
+                        },
+                    ): str,
+                    vol.Optional(
+                        CONF_PORT,
+                        default=self._discovered_port if discovered else DEFAULT_LOCAL_PORT,
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
+                }
+            ),
+            errors=errors,
+        )
+
+    async def async_step_reauth(self, entry_data: Mapping[str, Any]):
+        """Handle the cloud rejecting the stored password."""
+        self._reauth_entry = self.hass.config_entries.async_get_entry(
+            self.context["entry_id"]
+        )
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(
+        self, user_input: Optional[Dict[str, Any]] = None
+    ):
+        """Ask for the new password and hand it to every entry of the account."""
+        errors: Dict[str, str] = {}
+        username = self._reauth_entry.data[CONF_USERNAME]
+
+        if user_input is not None:
+            password = user_input[CONF_PASSWORD]
+            try:
+                # The fresh token is stored for the running client to pick up.
+                await AquastillaSoftenerApi(
+                    async_get_clientsession(self.hass),
+                    username,
+                    password,
+                    api_base_url=self._reauth_entry.data.get(CONF_API_BASE_URL, API_BASE_URL),
+                    token_store=token_store(self.hass, username),
+                ).login()
+            except AquastillaSoftenerAuthError as e:
+                _LOGGER.warning("Reauthentication failed: %s", e)
+                errors["base"] = "auth_failed"
+            except AquastillaSoftenerApiError as e:
+                _LOGGER.warning("Reauthentication failed: %s", e)
+                errors["base"] = "cannot_connect"
+            else:
+                # The update listeners pass the password to the shared
+                # client; nothing is reloaded.
+                for entry in self.hass.config_entries.async_entries(DOMAIN):
+                    if entry.data.get(CONF_USERNAME) == username:
+                        self.hass.config_entries.async_update_entry(
+                            entry, data={**entry.data, CONF_PASSWORD: password}
+                        )
+                return self.async_abort(reason="reauth_successful")
+
+        return self.async_show_form(
+            step_id="reauth_confirm",
+            data_schema=vol.Schema({vol.Required(CONF_PASSWORD): str}),
+            description_placeholders={CONF_USERNAME: username},
             errors=errors,
         )
 
+
+class AquastillaSoftenerOptionsFlow(config_entries.OptionsFlow):
+    """Options flow for AquastillaSoftener integration."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        self._config_entry = config_entry
+
+    async def async_step_init(self, user_input: Optional[Dict[str, Any]] = None):
+        """Handle polling and timeout options."""
+        errors: Dict[str, str] = {}
+
+        if user_input is not None:
+            if user_input[CONF_SCAN_INTERVAL_MIN] > user_input[CONF_SCAN_INTERVAL_MAX]:
+                errors["base"] = "invalid_scan_interval"
+            else:
+                return self.async_create_entry(
+                    title="", data={**self._config_entry.options, **user_input}
+                )
+
+        options = self._config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_SCAN_INTERVAL_MIN,
+                        default=options.get(CONF_SCAN_INTERVAL_MIN, DEFAULT_SCAN_INTERVAL_MIN),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=5, max=3600)),
+                    vol.Required(
+                        CONF_SCAN_INTERVAL_MAX,
+                        default=options.get(CONF_SCAN_INTERVAL_MAX, DEFAULT_SCAN_INTERVAL_MAX),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=5, max=3600)),
+                    vol.Required(
+                        CONF_CONNECT_TIMEOUT,
+                        default=options.get(CONF_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=60)),
+                    vol.Required(
+                        CONF_READ_TIMEOUT,
+                        default=options.get(CONF_READ_TIMEOUT, DEFAULT_READ_TIMEOUT),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=120)),
+                    vol.Required(
+                        CONF_UPDATE_SOURCE,
+                        default=options.get(CONF_UPDATE_SOURCE, DEFAULT_UPDATE_SOURCE),
+                    ): SelectSelector(
+                        SelectSelectorConfig(
+                            options=[UPDATE_SOURCE_POLLING, UPDATE_SOURCE_LONG_POLL],
+                            mode=SelectSelectorMode.DROPDOWN,
+                            translation_key=CONF_UPDATE_SOURCE,
+                        )
+                    ),
+                    vol.Required(
+                        CONF_SENSOR_GROUPS,
+                        default=options.get(CONF_SENSOR_GROUPS, DEFAULT_SENSOR_GROUPS),
+                    ): SelectSelector(
+                        SelectSelectorConfig(
+                            options=list(SENSOR_GROUPS),
+                            multiple=True,
+                            mode=SelectSelectorMode.LIST,
+                            translation_key=CONF_SENSOR_GROUPS,
+                        )
+                    ),
+                    vol.Optional(
+                        CONF_LEAK_SENSORS,
+                        default=options.get(CONF_LEAK_SENSORS, []),
+                    ): EntitySelector(
+                        EntitySelectorConfig(
+                            domain="binary_sensor", device_class="moisture", multiple=True
+                        )
+                    ),
+                    vol.Required(
+                        CONF_LEAK_MAX_FLOW,
+                        default=options.get(CONF_LEAK_MAX_FLOW, DEFAULT_LEAK_MAX_FLOW),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                    vol.Required(
+                        CONF_LEAK_FLOW_MINUTES,
+                        default=options.get(CONF_LEAK_FLOW_MINUTES, DEFAULT_LEAK_FLOW_MINUTES),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1440)),
+                }
+            ),
+            errors=errors,
+        )
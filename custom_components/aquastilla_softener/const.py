@@ -1,8 +1,79 @@
 from typing import Final
 
 DOMAIN: Final = "aquastilla_softener"
+DATA_ACCOUNTS: Final = f"{DOMAIN}_accounts"
+DATA_SCHEDULER: Final = f"{DOMAIN}_scheduler"
 
 CONF_USERNAME: Final = "username"
 CONF_PASSWORD: Final = "password"
 CONF_DEVICE: Final = "device_uuid"
+CONF_HOST: Final = "host"
+CONF_PORT: Final = "port"
 
+API_BASE_URL: Final = "https://backend.waterlife.pl:15880"
+# Client identity of the aquastilla_softener library, which the cloud expects.
+USER_AGENT: Final = "okhttp/4.9.1"
+# Not offered in the config flow; lets an entry target a stand-in cloud,
+# such as the fake one used by the benchmarks.
+CONF_API_BASE_URL: Final = "api_base_url"
+
+# Local HTTP interface of the softener.
+DEFAULT_LOCAL_PORT: Final = 80
+# Seconds; a LAN round trip either completes quickly or the device is away.
+LOCAL_CONNECT_TIMEOUT: Final = 1
+LOCAL_READ_TIMEOUT: Final = 2
+# Seconds the cloud is used alone after the device stopped answering locally.
+LOCAL_RETRY_INTERVAL: Final = 60
+
+TOKEN_STORAGE_VERSION: Final = 1
+HISTORY_STORAGE_VERSION: Final = 1
+FORECAST_STORAGE_VERSION: Final = 1
+REGENERATION_STORAGE_VERSION: Final = 1
+
+CONF_SCAN_INTERVAL_MIN: Final = "scan_interval_min"
+CONF_SCAN_INTERVAL_MAX: Final = "scan_interval_max"
+
+# Seconds between polls while a regeneration or firmware upgrade is running
+# (min) and while the softener is idle or offline (max).
+DEFAULT_SCAN_INTERVAL_MIN: Final = 15
+DEFAULT_SCAN_INTERVAL_MAX: Final = 300
+
+CONF_CONNECT_TIMEOUT: Final = "connect_timeout"
+CONF_READ_TIMEOUT: Final = "read_timeout"
+
+# Seconds, matching the defaults of the aquastilla_softener library.
+DEFAULT_CONNECT_TIMEOUT: Final = 5
+DEFAULT_READ_TIMEOUT: Final = 15
+
+CONF_UPDATE_SOURCE: Final = "update_source"
+UPDATE_SOURCE_POLLING: Final = "polling"
+UPDATE_SOURCE_LONG_POLL: Final = "long_poll"
+DEFAULT_UPDATE_SOURCE: Final = UPDATE_SOURCE_POLLING
+
+CONF_SENSOR_GROUPS: Final = "sensor_groups"
+SENSOR_GROUP_WATER: Final = "water"
+SENSOR_GROUP_SALT: Final = "salt"
+SENSOR_GROUP_REGENERATION: Final = "regeneration"
+SENSOR_GROUP_FIRMWARE: Final = "firmware"
+SENSOR_GROUP_CONTROLS: Final = "controls"
+SENSOR_GROUP_DIAGNOSTICS: Final = "diagnostics"
+SENSOR_GROUPS: Final = (
+    SENSOR_GROUP_WATER,
+    SENSOR_GROUP_SALT,
+    SENSOR_GROUP_REGENERATION,
+    SENSOR_GROUP_FIRMWARE,
+    SENSOR_GROUP_CONTROLS,
+    SENSOR_GROUP_DIAGNOSTICS,
+)
+# All on, which matches the entities created before groups existed.
+DEFAULT_SENSOR_GROUPS: Final = list(SENSOR_GROUPS)
+# Sent with the entry id when the enabled groups of an entry change.
+SIGNAL_SENSOR_GROUPS_UPDATED: Final = f"{DOMAIN}_sensor_groups_updated_{{}}"
+
+CONF_LEAK_SENSORS: Final = "leak_sensors"
+CONF_LEAK_MAX_FLOW: Final = "leak_max_flow"
+CONF_LEAK_FLOW_MINUTES: Final = "leak_flow_minutes"
+# Litres per minute drawn without a break for this many minutes count as a
+# leak; a limit of 0 turns flow detection off.
+DEFAULT_LEAK_MAX_FLOW: Final = 0
+DEFAULT_LEAK_FLOW_MINUTES: Final = 30
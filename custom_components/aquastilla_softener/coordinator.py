@@ -1,63 +1,646 @@
-from abc import ABC, abstractmethod
+import asyncio
+from collections import Counter
+import dataclasses
 from datetime import datetime, timedelta
 import logging
-from typing import Optional
+import random
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Mapping, Optional
 from homeassistant.helpers.device_registry import DeviceInfo
-from homeassistant.components.binary_sensor import (
-    BinarySensorEntity,
-    BinarySensorEntityDescription,
-    BinarySensorDeviceClass
-)
-
 from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
-    CoordinatorEntity,
 )
 
 from aquastilla_softener import (
-    AquastillaSoftener,
     AquastillaSoftenerData,
     AquastillaSoftenerState,
 )
 
-from homeassistant import config_entries, core
-from homeassistant.const import PERCENTAGE, UnitOfVolume
+from homeassistant import core
 
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE
+from .api import (
+    AquastillaSoftenerApi,
+    AquastillaSoftenerAuthError,
+    AquastillaSoftenerRateLimitError,
+)
+from .const import (
+    DOMAIN,
+    CONF_USERNAME,
+    CONF_SCAN_INTERVAL_MIN,
+    CONF_SCAN_INTERVAL_MAX,
+    DEFAULT_SCAN_INTERVAL_MIN,
+    DEFAULT_SCAN_INTERVAL_MAX,
+    CONF_UPDATE_SOURCE,
+    DEFAULT_UPDATE_SOURCE,
+    UPDATE_SOURCE_LONG_POLL,
+)
+from .commands import AquastillaSoftenerCommandQueue
+from .scheduler import AquastillaSoftenerScheduler
+from .transport import AquastillaSoftenerTransport
+from .update_source import (
+    AquastillaSoftenerLongPollUpdateSource,
+    AquastillaSoftenerUpdateSource,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
-UPDATE_INTERVAL = timedelta(minutes=1)
+REGENERATION_STATES = frozenset(
+    {
+        AquastillaSoftenerState.BRINEREFILL,
+        AquastillaSoftenerState.SALTDISSOLVE,
+        AquastillaSoftenerState.REGENBACKWASH,
+        AquastillaSoftenerState.BRINECOLLECT,
+        AquastillaSoftenerState.FASTWASH,
+    }
+)
+
+DATA_FIELDS = tuple(field.name for field in dataclasses.fields(AquastillaSoftenerData))
+
+
+def changed_fields(
+    old: Optional[AquastillaSoftenerData], new: AquastillaSoftenerData
+) -> FrozenSet[str]:
+    """Return the names of the fields that differ between two snapshots."""
+    if old is None:
+        return frozenset(DATA_FIELDS)
+    return frozenset(
+        name for name in DATA_FIELDS if getattr(old, name) != getattr(new, name)
+    )
+
+# Upper bound for the exponential backoff between failed polls.
+BACKOFF_MAX = timedelta(minutes=15)
+# Consecutive failed polls after which the circuit breaker opens, and how
+# often an open breaker lets a single probe through.
+BREAKER_THRESHOLD = 5
+BREAKER_PROBE_INTERVAL = timedelta(minutes=15)
+# Entries of one account set up within this many seconds of each other
+# share a single background first refresh.
+FIRST_REFRESH_DELAY = 1
+# Seconds after a command before the refresh that confirms it. Commands
+# issued within this window share one confirmation refresh.
+CONFIRM_DELAY = 10
+# Polling interval kept as a safety net while an update source is connected.
+STREAM_SAFETY_INTERVAL = timedelta(minutes=30)
+
+
+class AquastillaSoftenerFailurePolicy:
+    """Exponential backoff with jitter plus a circuit breaker.
+
+    ``record_failure`` returns how long to wait before the next attempt.
+    Transport and server errors back off exponentially from the normal
+    polling interval. Rate limiting honours the cloud's Retry-After. Auth
+    errors open the breaker straight away, since retrying a rejected password
+    only risks an account lockout. Once open, the breaker rejects every
+    refresh until the probe time and then lets a single attempt through.
+    """
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self._open_until: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._open_until is not None
+
+    def allow_request(self) -> bool:
+        return self._open_until is None or time.monotonic() >= self._open_until
+
+    def probe_in(self) -> float:
+        if self._open_until is None:
+            return 0.0
+        return max(0.0, self._open_until - time.monotonic())
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._open_until = None
+
+    def record_failure(self, err: Exception, interval: timedelta) -> timedelta:
+        self.failures += 1
+        if isinstance(err, AquastillaSoftenerAuthError) or self.failures >= BREAKER_THRESHOLD:
+            self._open_until = time.monotonic() + BREAKER_PROBE_INTERVAL.total_seconds()
+            return BREAKER_PROBE_INTERVAL
+        cap = max(interval, BACKOFF_MAX).total_seconds()
+        delay = min(cap, interval.total_seconds() * 2 ** (self.failures - 1))
+        # Full jitter over the upper half keeps retries from many
+        # installations from lining up after a cloud outage.
+        delay = random.uniform(delay / 2, delay)
+        if isinstance(err, AquastillaSoftenerRateLimitError) and err.retry_after:
+            delay = max(delay, err.retry_after)
+        return timedelta(seconds=delay)
+
 
+def is_busy(data: AquastillaSoftenerData) -> bool:
+    """Return True while a regeneration or firmware upgrade is in progress."""
+    return (
+        data.state in REGENERATION_STATES
+        or 0 < (data.regen_percentage or 0) < 100
+        or 0 < (data.firmware_upgrade_percentage or 0) < 100
+    )
 
-class AquastillaSoftenerCoordinator(DataUpdateCoordinator):
-    def __init__(self, hass: core.HomeAssistant, softener: AquastillaSoftener, device: dict):
+
+class AquastillaSoftenerCoordinator(DataUpdateCoordinator[Dict[str, AquastillaSoftenerData]]):
+    """Poll every softener of one Aquastilla account in a single cycle.
+
+    Config entries stay per device, but all entries of an account register
+    their device with the same coordinator. Each cycle fans out to all
+    registered devices concurrently over one session; ``data`` maps a device
+    uuid to its latest ``AquastillaSoftenerData``. With a ``scheduler``,
+    scheduled polls land on the account's slot of it, so the accounts of
+    the integration poll at different times.
+    """
+
+    def __init__(
+        self,
+        hass: core.HomeAssistant,
+        softener: AquastillaSoftenerApi,
+        scheduler: Optional[AquastillaSoftenerScheduler] = None,
+    ):
         super().__init__(
             hass,
             _LOGGER,
             name="Aquastilla Softener",
-            update_interval=UPDATE_INTERVAL,
+            update_interval=timedelta(seconds=DEFAULT_SCAN_INTERVAL_MAX),
         )
         self._softener = softener
-        self._device = device
-        self.device_data: Optional[AquastillaSoftenerData] = None  # type hint
+        self._scheduler = scheduler
+        self._unsub_scheduler = (
+            None if scheduler is None else scheduler.register(softener.username)
+        )
+        self._devices: Dict[str, dict] = {}
+        self._device_options: Dict[str, Mapping[str, Any]] = {}
+        self._transports: Dict[str, AquastillaSoftenerTransport] = {}
+        self._command_queues: Dict[str, AquastillaSoftenerCommandQueue] = {}
+        self._device_info: Dict[str, DeviceInfo] = {}
+        # How many consumers read each field of each device
+        self._subscriptions: Dict[str, Counter[str]] = {}
+        self._failed_devices: set[str] = set()
+        self._pending_devices: set[str] = set()
+        self._first_refresh_lock = asyncio.Lock()
+        self._changed: Dict[str, FrozenSet[str]] = {}
+        self._failure_policy = AquastillaSoftenerFailurePolicy()
+        self._fetch: Optional[asyncio.Future] = None
+        self._unsub_confirm: Optional[Callable[[], None]] = None
+        self.data = {}
+        self.last_success_time: Optional[datetime] = None
+        # Bumped by entities on every state write made for an update.
+        self.state_writes = 0
+        self.state_writes_per_cycle: Optional[int] = None
+        self._update_source: Optional[AquastillaSoftenerUpdateSource] = None
+        self._streaming = False
 
     @property
-    def api(self) -> AquastillaSoftener:
+    def api(self) -> AquastillaSoftenerApi:
         """Expose the underlying API client for use in entities."""
         return self._softener
 
-    async def _async_update_data(self) -> AquastillaSoftenerData:
+    @property
+    def devices(self) -> Dict[str, dict]:
+        return self._devices
+
+    def transport(self, uuid: str) -> AquastillaSoftenerTransport:
+        """Return the transport reads and commands of a device go through."""
+        return self._transports.get(uuid, self._softener)
+
+    @callback
+    def async_subscribe_fields(
+        self, uuid: str, fields: Iterable[str]
+    ) -> Callable[[], None]:
+        """Declare that a consumer reads ``fields`` of a device.
+
+        Fetches may skip endpoints that serve no subscribed field. Returns a
+        callback that withdraws the subscription.
+        """
+        fields = tuple(fields)
+        counter = self._subscriptions.setdefault(uuid, Counter())
+        counter.update(fields)
+
+        @callback
+        def _unsubscribe() -> None:
+            counter.subtract(fields)
+            for field in fields:
+                if counter[field] <= 0:
+                    del counter[field]
+
+        return _unsubscribe
+
+    def subscribed_fields(self, uuid: str) -> FrozenSet[str]:
+        return frozenset(self._subscriptions.get(uuid, ()))
+
+    def device_info(self, uuid: str) -> DeviceInfo:
+        """Return the DeviceInfo shared by every entity of a device."""
+        return self._device_info[uuid]
+
+    def command_queue(self, uuid: str) -> AquastillaSoftenerCommandQueue:
+        return self._command_queues[uuid]
+
+    async def async_send_command(
+        self, uuid: str, command: str, *args: Any, confirm: bool = True
+    ) -> None:
+        """Send a command through the device's queue, then confirm it.
+
+        Raises whatever the transport raised; no confirmation is scheduled
+        for a failed command. Callers sending a batch pass ``confirm=False``
+        and request one confirmation for all of it.
+        """
+        await self._command_queues[uuid].async_send(command, *args)
+        if confirm:
+            self.async_request_confirmation()
+
+    def device_data(self, uuid: str) -> Optional[AquastillaSoftenerData]:
+        return self.data.get(uuid)
+
+    def device_changed(self, uuid: str, fields: Iterable[str]) -> bool:
+        """Return True if the last update changed any of ``fields`` for a device."""
+        return not self._changed.get(uuid, frozenset()).isdisjoint(fields)
+
+    def device_available(self, uuid: str) -> bool:
+        if not self.last_update_success:
+            return False
+        if uuid in self._pending_devices:
+            # Still waiting for the first fetch: keep showing restored state.
+            return True
+        return uuid in self.data and uuid not in self._failed_devices
+
+    @callback
+    def async_add_device(
+        self,
+        device: dict,
+        options: Mapping[str, Any],
+        transport: Optional[AquastillaSoftenerTransport] = None,
+    ) -> Callable[[], None]:
+        """Register a device without touching the cloud.
+
+        Its first snapshot is fetched by ``async_first_refresh``, which the
+        entry runs in the background once its entities have been added.
+        ``transport`` replaces the account's cloud API for this device.
+        """
+        uuid = device["uuid"]
+        self._devices[uuid] = device
+        self._device_options[uuid] = options
+        self._device_info[uuid] = DeviceInfo(
+            identifiers={(DOMAIN, uuid)},
+            name=device["model"]["model"],
+            serial_number=device["serial"],
+            model=device["model"]["model"],
+        )
+        if transport is not None:
+            self._transports[uuid] = transport
+        if (queue := self._command_queues.pop(uuid, None)) is not None:
+            queue.async_shutdown()
+        self._command_queues[uuid] = AquastillaSoftenerCommandQueue(self, device)
+        if uuid not in self.data:
+            self._pending_devices.add(uuid)
+        self.update_interval = self._next_interval(self.data)
+        self._async_select_update_source()
+
+        @callback
+        def _remove_device() -> None:
+            self._devices.pop(uuid, None)
+            self._device_options.pop(uuid, None)
+            self._device_info.pop(uuid, None)
+            self._subscriptions.pop(uuid, None)
+            self._transports.pop(uuid, None)
+            if (queue := self._command_queues.pop(uuid, None)) is not None:
+                queue.async_shutdown()
+            self._pending_devices.discard(uuid)
+            self._failed_devices.discard(uuid)
+            self.data = {k: v for k, v in self.data.items() if k != uuid}
+            self._async_select_update_source()
+
+        return _remove_device
+
+    @callback
+    def async_set_device_options(self, uuid: str, options: Mapping[str, Any]) -> None:
+        """Apply a device's changed options to the running coordinator.
+
+        The polling interval is recomputed at once, unless a backoff is in
+        progress; that keeps its own schedule until the next success.
+        """
+        self._device_options[uuid] = options
+        self._async_select_update_source()
+        if not self._failure_policy.failures:
+            self.update_interval = self._next_interval(self.data)
+            if self._listeners:
+                self._schedule_refresh()
+
+    @callback
+    def async_set_transport(
+        self, uuid: str, transport: Optional[AquastillaSoftenerTransport]
+    ) -> None:
+        """Switch a device to another transport, or back to the cloud API."""
+        if transport is None:
+            self._transports.pop(uuid, None)
+        else:
+            self._transports[uuid] = transport
+
+    @callback
+    def _async_start_reauth(self) -> None:
+        """Ask for a new password on one entry of the account.
+
+        The flow updates every entry of the account, so one is enough. The
+        breaker stays open meanwhile, keeping the rejected password away
+        from the cloud.
+        """
+        for entry in self.hass.config_entries.async_entries(DOMAIN):
+            if entry.data.get(CONF_USERNAME) == self._softener.username:
+                entry.async_start_reauth(self.hass)
+                return
+
+    @callback
+    def async_set_password(self, password: str) -> None:
+        """Resume with a password from reauthentication.
+
+        Closes the breaker, restarts a change channel that stopped on the
+        rejected password, and refreshes at once.
+        """
+        if not self._softener.set_password(password):
+            return
+        self._failure_policy.record_success()
+        if self._update_source is not None:
+            self.async_set_update_source(None)
+            self._async_select_update_source()
+        self.update_interval = self._next_interval(self.data)
+        self.hass.async_create_task(self.async_request_refresh())
+
+    @property
+    def streaming(self) -> bool:
+        return self._streaming
+
+    @callback
+    def async_set_update_source(
+        self, source: Optional[AquastillaSoftenerUpdateSource]
+    ) -> None:
+        """Replace the update source; ``None`` leaves polling alone."""
+        if self._update_source is not None:
+            self._update_source.async_stop()
+        self._update_source = source
+        if source is not None:
+            source.async_start()
+
+    @callback
+    def _async_select_update_source(self) -> None:
+        # The account streams as soon as any of its devices asks for it.
+        wanted = any(
+            options.get(CONF_UPDATE_SOURCE, DEFAULT_UPDATE_SOURCE) == UPDATE_SOURCE_LONG_POLL
+            for options in self._device_options.values()
+        )
+        if wanted and self._update_source is None:
+            self.async_set_update_source(AquastillaSoftenerLongPollUpdateSource(self))
+        elif not wanted and self._update_source is not None:
+            self.async_set_update_source(None)
+
+    @callback
+    def async_set_streaming(self, connected: bool) -> None:
+        """Relax polling while an update source is connected, restore it after."""
+        if connected == self._streaming:
+            return
+        self._streaming = connected
+        _LOGGER.debug("Update source %s", "connected" if connected else "disconnected")
+        self.update_interval = self._next_interval(self.data)
+        if self._listeners:
+            self._schedule_refresh()
+
+    async def async_refresh_devices(self, uuids: Iterable[str]) -> None:
+        """Fetch some devices now and push their data to the listeners."""
+        devices = [self._devices[uuid] for uuid in uuids if uuid in self._devices]
+        if not devices:
+            return
         try:
-            data = await self.hass.async_add_executor_job(
-                self._softener.get_device_data, self._device
+            data = await self._async_poll(devices)
+        except UpdateFailed as err:
+            # Left to the next poll to report.
+            _LOGGER.debug("Pushed refresh failed: %s", err)
+            return
+        self.async_set_updated_data(data)
+
+    async def async_read_back(self, uuid: str) -> Optional[AquastillaSoftenerData]:
+        """Fetch one device to check a safety command, whatever the breaker says.
+
+        The fetch neither waits for the breaker nor feeds the failure
+        policy: it only tells the caller whether its command took effect,
+        and retrying it must not push the account further into backoff. A
+        new snapshot goes to the listeners; a failed fetch returns None.
+        """
+        device = self._devices.get(uuid)
+        if device is None:
+            return None
+        try:
+            data = await self.transport(uuid).get_device_data(
+                device, self.subscribed_fields(uuid)
             )
-            self.device_data = data
-            _LOGGER.debug("Fetched data: %s", data)
-            return data
         except Exception as err:
-            raise UpdateFailed(f"Get data failed: {err}")
+            _LOGGER.debug("Read-back of %s failed: %s", uuid, err)
+            return None
+        self._changed = {uuid: changed_fields(self.data.get(uuid), data)}
+        self._failed_devices.discard(uuid)
+        # Not a poll: the account keeps its schedule and its success state.
+        self.data = {**self.data, uuid: data}
+        self.async_update_listeners()
+        return data
 
+    async def async_first_refresh(self) -> None:
+        """Fetch devices that have no data yet, off the startup path.
 
+        Entries of the same account usually start together; waiting
+        ``FIRST_REFRESH_DELAY`` lets them all register so a single refresh
+        covers every device, and later callers find nothing left to fetch.
+        """
+        await asyncio.sleep(FIRST_REFRESH_DELAY)
+        async with self._first_refresh_lock:
+            if self._pending_devices:
+                await self.async_refresh()
+
+    async def _async_update_data(self) -> Dict[str, AquastillaSoftenerData]:
+        devices = list(self._devices.values())
+        try:
+            return await self._async_poll(devices)
+        finally:
+            self._pending_devices.difference_update(device["uuid"] for device in devices)
+
+    async def _async_poll(self, devices: list[dict]) -> Dict[str, AquastillaSoftenerData]:
+        self._changed = {}
+        if not self._failure_policy.allow_request():
+            # Also covers refreshes requested by entities while the breaker
+            # is open: they fail fast instead of reaching the cloud.
+            self.update_interval = timedelta(seconds=self._failure_policy.probe_in())
+            raise UpdateFailed(
+                f"Cloud unavailable, next attempt in {self._failure_policy.probe_in():.0f}s"
+            )
+        self._fetch = asyncio.gather(
+            *(
+                self.transport(device["uuid"]).get_device_data(
+                    device, self.subscribed_fields(device["uuid"])
+                )
+                for device in devices
+            ),
+            return_exceptions=True,
+        )
+        try:
+            results = await self._fetch
+        except asyncio.CancelledError:
+            if (task := asyncio.current_task()) is not None and task.cancelling():
+                raise
+            raise UpdateFailed("Refresh cancelled") from None
+        finally:
+            self._fetch = None
+        data = dict(self.data)
+        failed = set()
+        for device, result in zip(devices, results):
+            if isinstance(result, BaseException):
+                failed.add(device["uuid"])
+            else:
+                self._changed[device["uuid"]] = changed_fields(
+                    data.get(device["uuid"]), result
+                )
+                data[device["uuid"]] = result
+        if devices and len(failed) == len(devices):
+            err = results[0]
+            self.update_interval = self._failure_policy.record_failure(
+                err, self._next_interval(data)
+            )
+            if isinstance(err, AquastillaSoftenerAuthError):
+                self._async_start_reauth()
+            if self._failure_policy.is_open:
+                raise UpdateFailed(
+                    f"Get data failed: {err}; pausing polling for {self.update_interval}"
+                )
+            raise UpdateFailed(f"Get data failed: {err}; retrying in {self.update_interval}")
+        self._failure_policy.record_success()
+        for device, result in zip(devices, results):
+            if device["uuid"] in failed:
+                _LOGGER.warning("Get data for %s failed: %s", device["uuid"], result)
+        polled = {device["uuid"] for device in devices}
+        self._failed_devices = (self._failed_devices - polled) | failed
+        self.update_interval = self._next_interval(data)
+        self.last_success_time = dt_util.utcnow()
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(
+                "Fetched %d device(s), changed: %s, next poll in %s",
+                len(devices) - len(failed),
+                {uuid: sorted(fields) for uuid, fields in self._changed.items() if fields},
+                self.update_interval,
+            )
+        return data
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return the polling and failure state of this coordinator."""
+        return {
+            "devices": list(self._devices),
+            "pending_devices": sorted(self._pending_devices),
+            "failed_devices": sorted(self._failed_devices),
+            "last_update_success": self.last_update_success,
+            "last_success_time": self.last_success_time,
+            "last_exception": repr(self.last_exception) if self.last_exception else None,
+            "update_interval": self.update_interval and self.update_interval.total_seconds(),
+            "consecutive_failures": self._failure_policy.failures,
+            "breaker_open": self._failure_policy.is_open,
+            "breaker_probe_in": self._failure_policy.probe_in(),
+            "state_writes_per_cycle": self.state_writes_per_cycle,
+            "update_source": type(self._update_source).__name__
+            if self._update_source
+            else None,
+            "streaming": self._streaming,
+            "poll_phase": None
+            if self._scheduler is None
+            else round(self._scheduler.phase(self._softener.username), 3),
+            "subscribed_fields": {
+                uuid: sorted(counter) for uuid, counter in self._subscriptions.items()
+            },
+            "command_queues": {
+                uuid: queue.stats.as_dict()
+                for uuid, queue in self._command_queues.items()
+            },
+        }
+
+    @callback
+    def _schedule_refresh(self) -> None:
+        super()._schedule_refresh()
+        # Backoff and breaker probes keep their own, already jittered, times.
+        if (
+            self._scheduler is None
+            or self._unsub_refresh is None
+            or self._failure_policy.failures
+        ):
+            return
+        self._unsub_refresh()
+        delay = self._scheduler.delay(
+            self._softener.username, self.update_interval.total_seconds()
+        )
+        self._unsub_refresh = self.hass.loop.call_later(
+            delay, self.hass.async_run_hass_job, self._job
+        ).cancel
+
+    @callback
+    def async_update_listeners(self) -> None:
+        self.state_writes = 0
+        super().async_update_listeners()
+        self.state_writes_per_cycle = self.state_writes
+
+    @callback
+    def async_request_confirmation(self) -> None:
+        """Schedule one refresh ``CONFIRM_DELAY`` after the last command.
+
+        The cloud applies commands with some lag, so refreshing right away
+        would often read back the old state. Each new command pushes the
+        pending confirmation back, so a burst of commands costs one refresh.
+        """
+        if self._unsub_confirm is not None:
+            self._unsub_confirm()
+        self._unsub_confirm = async_call_later(
+            self.hass, CONFIRM_DELAY, self._async_confirm
+        )
+
+    async def _async_confirm(self, _now: datetime) -> None:
+        self._unsub_confirm = None
+        await self.async_refresh()
+
+    @callback
+    def async_cancel_refresh(self) -> None:
+        """Abort the cloud requests of a refresh that is in flight."""
+        if self._fetch is not None:
+            self._fetch.cancel()
+
+    async def async_shutdown(self) -> None:
+        if self._devices:
+            # DataUpdateCoordinator also shuts down with the entry that was
+            # being set up when it was created; other entries of the account
+            # still use it. The last entry out releases it.
+            return
+        self.async_set_update_source(None)
+        if self._unsub_confirm is not None:
+            self._unsub_confirm()
+            self._unsub_confirm = None
+        self.async_cancel_refresh()
+        if self._unsub_scheduler is not None:
+            self._unsub_scheduler()
+            self._unsub_scheduler = None
+        await super().async_shutdown()
+
+    def _next_interval(self, data: Dict[str, AquastillaSoftenerData]) -> timedelta:
+        """Poll fast while any device regenerates or upgrades, slow otherwise.
+
+        With several devices on the account the most demanding device wins:
+        the bounds are the smallest min and max configured across them.
+        """
+        options = self._device_options.values()
+        scan_min = min(
+            (o.get(CONF_SCAN_INTERVAL_MIN, DEFAULT_SCAN_INTERVAL_MIN) for o in options),
+            default=DEFAULT_SCAN_INTERVAL_MIN,
+        )
+        scan_max = min(
+            (o.get(CONF_SCAN_INTERVAL_MAX, DEFAULT_SCAN_INTERVAL_MAX) for o in options),
+            default=DEFAULT_SCAN_INTERVAL_MAX,
+        )
+        if self._streaming:
+            return max(timedelta(seconds=scan_max), STREAM_SAFETY_INTERVAL)
+        if any(
+            is_busy(device_data)
+            for uuid, device_data in data.items()
+            if uuid in self._devices
+        ):
+            return timedelta(seconds=scan_min)
+        return timedelta(seconds=max(scan_min, scan_max))
@@ -0,0 +1,45 @@
+import dataclasses
+from typing import Any, Dict
+
+from homeassistant import config_entries, core
+from homeassistant.components.diagnostics import async_redact_data
+
+from .const import DOMAIN, DATA_SCHEDULER, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE, CONF_HOST
+from .local import AquastillaSoftenerFailoverTransport
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD, CONF_HOST, "email", "token", "jwt", "serial"}
+
+
+def _transport_diagnostics(transport) -> Dict[str, Any]:
+    if isinstance(transport, AquastillaSoftenerFailoverTransport):
+        return {"type": "local", **transport.diagnostics()}
+    return {"type": "cloud"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> Dict[str, Any]:
+    hass_data = hass.data[DOMAIN][entry.entry_id]
+    coordinator = hass_data["coordinator"]
+    device = hass_data[CONF_DEVICE]
+    data = coordinator.device_data(device["uuid"])
+    forecast = hass_data["forecast"]
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "data": None if data is None else dataclasses.asdict(data),
+        "coordinator": coordinator.diagnostics(),
+        "cloud": coordinator.api.stats.as_dict(),
+        "scheduler": hass.data[DATA_SCHEDULER].diagnostics(),
+        "transport": _transport_diagnostics(coordinator.transport(device["uuid"])),
+        "leak": hass_data["leak"].diagnostics(),
+        "regeneration": hass_data["regeneration"].diagnostics(),
+        "history_samples": len(hass_data["history"]),
+        "forecast": {
+            "salt_empty": forecast.salt_empty,
+            "liters_until_regeneration": forecast.liters_until_regeneration,
+            "usage_rate": forecast.usage_rate,
+        },
+    }
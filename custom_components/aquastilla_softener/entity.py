@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+
+from homeassistant import config_entries, core
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import EntityDescription
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from aquastilla_softener import AquastillaSoftenerData
+
+from .const import (
+    DOMAIN,
+    CONF_SENSOR_GROUPS,
+    DEFAULT_SENSOR_GROUPS,
+    SIGNAL_SENSOR_GROUPS_UPDATED,
+)
+from .coordinator import AquastillaSoftenerCoordinator
+
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerEntityDescription(EntityDescription):
+    # AquastillaSoftenerData fields the entity reads
+    fields: tuple[str, ...] = ()
+    # Group that can be turned off in the options; None for entities that
+    # are always present
+    group: Optional[str] = None
+
+
+class AquastillaSoftenerEntity(CoordinatorEntity[AquastillaSoftenerCoordinator]):
+    """An entity of one softener, fed by its account coordinator.
+
+    Everything that does not change with the data is set once here: the
+    unique id, and the DeviceInfo the coordinator built when the device
+    registered. The description's ``fields`` are subscribed with the
+    coordinator while the entity is added, so fetches cover what it reads.
+    An update that changes none of them, and not the availability either,
+    writes no state.
+    """
+
+    _attr_has_entity_name = True
+
+    def __init__(
+        self,
+        coordinator: AquastillaSoftenerCoordinator,
+        device: dict,
+        entity_description: AquastillaSoftenerEntityDescription,
+    ):
+        super().__init__(coordinator)
+        self.entity_description = entity_description
+        self._device = device
+        self._attr_unique_id = f"{device['uuid']}_{entity_description.key}"
+        self._attr_device_info = coordinator.device_info(device["uuid"])
+        self._last_available: Optional[bool] = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_subscribe_fields(
+                self._device["uuid"], self.entity_description.fields
+            )
+        )
+
+    @property
+    def available(self) -> bool:
+        return self.coordinator.device_available(self._device["uuid"])
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        uuid = self._device["uuid"]
+        available = self.available
+        if available == self._last_available and not self.coordinator.device_changed(
+            uuid, self.entity_description.fields
+        ):
+            return
+        self._last_available = available
+        data = self.coordinator.device_data(uuid)
+        if data is not None:
+            self.update(data)
+        self.async_write_ha_state()
+        self.coordinator.state_writes += 1
+
+    def update(self, data: AquastillaSoftenerData) -> None:
+        """Set the entity's attributes from a new snapshot."""
+
+
+@callback
+def async_add_group_entities(
+    hass: core.HomeAssistant,
+    entry: config_entries.ConfigEntry,
+    platform: str,
+    async_add_entities: AddEntitiesCallback,
+    descriptions: Iterable[AquastillaSoftenerEntityDescription],
+    create: Callable[[AquastillaSoftenerEntityDescription], AquastillaSoftenerEntity],
+) -> None:
+    """Add the entities of the entry's enabled groups, and follow changes.
+
+    Turning a group off removes its entities along with their registry
+    entries; turning it on creates them. Neither touches the coordinator, so
+    a change costs no cloud request.
+    """
+    registry = er.async_get(hass)
+    descriptions = list(descriptions)
+    active: Dict[str, AquastillaSoftenerEntity] = {}
+
+    @callback
+    def _async_apply() -> None:
+        groups = entry.options.get(CONF_SENSOR_GROUPS, DEFAULT_SENSOR_GROUPS)
+        new = []
+        for description in descriptions:
+            if description.group is None or description.group in groups:
+                if description.key not in active:
+                    active[description.key] = entity = create(description)
+                    new.append(entity)
+                continue
+            entity = active.pop(description.key, None) or create(description)
+            if entity_id := registry.async_get_entity_id(platform, DOMAIN, entity.unique_id):
+                registry.async_remove(entity_id)
+        if new:
+            async_add_entities(new)
+
+    _async_apply()
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_SENSOR_GROUPS_UPDATED.format(entry.entry_id), _async_apply
+        )
+    )
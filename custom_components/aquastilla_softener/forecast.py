@@ -0,0 +1,162 @@
+import math
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from aquastilla_softener import AquastillaSoftenerData
+from homeassistant import core
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN, FORECAST_STORAGE_VERSION
+
+HOUR = 3600
+# Older salt samples fade out with this time constant, so the regression
+# follows the current consumption rather than last season's.
+SALT_HALF_LIFE = 14 * 24 * HOUR
+# Time constant of the water consumption rate average.
+USAGE_TIME_CONSTANT = 24 * HOUR
+# A salt level jump larger than this (in percentage points) is a refill.
+SALT_REFILL_THRESHOLD = 5
+# Forecasts further out than this are reported as unknown.
+SALT_FORECAST_HORIZON = 365 * 24 * HOUR
+# Seconds to batch updates before the estimator state is written to disk.
+FORECAST_SAVE_DELAY = 600
+
+
+class AquastillaSoftenerForecast:
+    """Incremental salt-depletion and water-consumption forecast of one device.
+
+    Every update is O(1) in time and memory. No samples are kept.
+
+    Salt uses an exponentially weighted least-squares line of salt level
+    over time. Only the five running sums of that regression are stored, and
+    they are cleared when a refill is detected. Water consumption is a
+    time-weighted moving average of liters per hour, derived from the daily
+    usage counter.
+    """
+
+    def __init__(self, hass: core.HomeAssistant, device: dict):
+        self._store = Store(
+            hass,
+            FORECAST_STORAGE_VERSION,
+            f"{DOMAIN}.{slugify(device['uuid'])}_forecast",
+        )
+        self._reset_salt()
+        self._last_salt: Optional[float] = None
+        self._last_time: Optional[float] = None
+        self._last_usage: Optional[float] = None
+        self.usage_rate: Optional[float] = None
+        self.salt_empty: Optional[datetime] = None
+        self.liters_until_regeneration: Optional[float] = None
+
+    def _reset_salt(self) -> None:
+        # Times are hours since _origin to keep the sums well conditioned.
+        self._origin: Optional[float] = None
+        self._sw = self._st = self._sy = self._stt = self._sty = 0.0
+
+    async def async_load(self) -> None:
+        stored = await self._store.async_load()
+        if not stored:
+            return
+        self._origin = stored["origin"]
+        self._sw = stored["sw"]
+        self._st = stored["st"]
+        self._sy = stored["sy"]
+        self._stt = stored["stt"]
+        self._sty = stored["sty"]
+        self._last_salt = stored["last_salt"]
+        self._last_time = stored["last_time"]
+        self._last_usage = stored["last_usage"]
+        self.usage_rate = stored["usage_rate"]
+
+    async def async_save(self) -> None:
+        await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+    @core.callback
+    def _data_to_save(self) -> Dict[str, Any]:
+        return {
+            "origin": self._origin,
+            "sw": self._sw,
+            "st": self._st,
+            "sy": self._sy,
+            "stt": self._stt,
+            "sty": self._sty,
+            "last_salt": self._last_salt,
+            "last_time": self._last_time,
+            "last_usage": self._last_usage,
+            "usage_rate": self.usage_rate,
+        }
+
+    @core.callback
+    def async_update(self, data: AquastillaSoftenerData) -> None:
+        now = data.timestamp.timestamp()
+        if self._last_time is not None and now <= self._last_time:
+            return
+        elapsed = None if self._last_time is None else now - self._last_time
+        self._update_salt(now, elapsed, data.salt_level_percent)
+        self._update_usage(elapsed, data.today_water_usage_liters)
+        self._last_time = now
+
+        if self.usage_rate is None or data.expected_regeneration_date is None:
+            self.liters_until_regeneration = None
+        else:
+            hours = max(0.0, (data.expected_regeneration_date.timestamp() - now) / HOUR)
+            self.liters_until_regeneration = round(
+                min(data.water_available_liters, self.usage_rate * hours)
+            )
+        self._store.async_delay_save(self._data_to_save, FORECAST_SAVE_DELAY)
+
+    def _update_salt(self, now: float, elapsed: Optional[float], salt: float) -> None:
+        if self._last_salt is not None and salt - self._last_salt > SALT_REFILL_THRESHOLD:
+            self._reset_salt()
+        self._last_salt = salt
+        if self._origin is None:
+            self._origin = now
+        elif elapsed:
+            decay = 0.5 ** (elapsed / SALT_HALF_LIFE)
+            self._sw *= decay
+            self._st *= decay
+            self._sy *= decay
+            self._stt *= decay
+            self._sty *= decay
+        t = (now - self._origin) / HOUR
+        self._sw += 1
+        self._st += t
+        self._sy += salt
+        self._stt += t * t
+        self._sty += t * salt
+
+        denominator = self._sw * self._stt - self._st * self._st
+        if denominator <= 1e-9:
+            self.salt_empty = None
+            return
+        slope = (self._sw * self._sty - self._st * self._sy) / denominator
+        if slope >= 0:
+            self.salt_empty = None
+            return
+        intercept = (self._sy - slope * self._st) / self._sw
+        empty_at = self._origin + (-intercept / slope) * HOUR
+        if empty_at - now > SALT_FORECAST_HORIZON:
+            self.salt_empty = None
+            return
+        self.salt_empty = dt_util.utc_from_timestamp(max(empty_at, now)).replace(
+            second=0, microsecond=0
+        )
+
+    def _update_usage(self, elapsed: Optional[float], usage: float) -> None:
+        last_usage, self._last_usage = self._last_usage, usage
+        if not elapsed or last_usage is None:
+            return
+        used = usage - last_usage
+        if used < 0:
+            # The cloud counter resets at midnight.
+            used = usage
+        rate = used / (elapsed / HOUR)
+        if self.usage_rate is None:
+            self.usage_rate = rate
+            return
+        alpha = 1 - math.exp(-elapsed / USAGE_TIME_CONSTANT)
+        self.usage_rate += alpha * (rate - self.usage_rate)
@@ -0,0 +1,238 @@
+import base64
+import logging
+import math
+import sys
+from array import array
+from typing import Any, Dict, Optional
+
+from aquastilla_softener import AquastillaSoftenerData
+from homeassistant import core
+from homeassistant.const import PERCENTAGE, UnitOfVolume
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN, DEFAULT_SCAN_INTERVAL_MAX, HISTORY_STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+# Days of samples kept at the slowest polling interval.
+HISTORY_DAYS = 7
+# Seconds to batch appends before the history is written to disk. Unloading
+# the entry and stopping Home Assistant write it straight away.
+HISTORY_SAVE_DELAY = 3600
+
+HOUR = 3600
+
+SERIES = ("timestamp", "water_usage", "salt_level", "water_available")
+
+
+class _HourAccumulator:
+    """Running min/max/mean of one series over the current hour."""
+
+    def __init__(self, state: Optional[Dict[str, float]] = None):
+        state = state or {}
+        self.count = int(state.get("count", 0))
+        self.total = state.get("total", 0.0)
+        self.min = state.get("min")
+        self.max = state.get("max")
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max}
+
+
+class AquastillaSoftenerHistory:
+    """Compact water-usage, salt and available-water history of one device.
+
+    Samples go into fixed-size ``array('d')`` ring buffers, one per series,
+    so memory stays constant and appends are O(1). They hold about
+    ``HISTORY_DAYS`` at ``scan_interval``. The filled part of the buffers is
+    persisted as raw bytes, oldest sample first, with a delayed ``Store``
+    save. When a sample opens a new
+    hour, the finished hour is pushed to long-term statistics with
+    ``async_add_external_statistics``:
+    - water usage as a running total, which the Energy dashboard can use
+    - salt level and available water as hourly mean, min and max
+    The recorder then never has to rebuild these from minute-level states.
+    """
+
+    def __init__(
+        self,
+        hass: core.HomeAssistant,
+        device: dict,
+        scan_interval: float = DEFAULT_SCAN_INTERVAL_MAX,
+    ):
+        self._hass = hass
+        self._device = device
+        self._object_id = slugify(device["uuid"])
+        self._capacity = math.ceil(HISTORY_DAYS * 86400 / scan_interval)
+        self._series = {name: array("d", bytes(8 * self._capacity)) for name in SERIES}
+        self._next = 0
+        self._size = 0
+        self._store = Store(
+            hass, HISTORY_STORAGE_VERSION, f"{DOMAIN}.{self._object_id}_history"
+        )
+        # Cumulative liters since the history started, and the last raw
+        # daily counter it was derived from.
+        self._usage_sum = 0.0
+        self._last_usage: Optional[float] = None
+        self._hour_start: Optional[float] = None
+        self._hour = {name: _HourAccumulator() for name in ("salt_level", "water_available")}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def usage_sum(self) -> float:
+        return self._usage_sum
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._series["timestamp"][(self._next - 1) % self._capacity]
+
+    def _ordered(self, name: str) -> array:
+        series = self._series[name]
+        if self._size < self._capacity:
+            return series[: self._size]
+        return series[self._next :] + series[: self._next]
+
+    def samples(self, name: str) -> list[float]:
+        """Return one series in chronological order."""
+        return self._ordered(name).tolist()
+
+    async def async_load(self) -> None:
+        stored = await self._store.async_load()
+        if not stored:
+            return
+        swap = stored.get("byteorder") != sys.byteorder
+        for name in SERIES:
+            series = array("d")
+            series.frombytes(base64.b64decode(stored["series"][name]))
+            if swap:
+                series.byteswap()
+            # Only the newest samples fit if the interval got shorter.
+            series = series[-self._capacity :]
+            self._series[name][: len(series)] = series
+        self._size = len(series)
+        self._next = self._size % self._capacity
+        self._usage_sum = stored["usage_sum"]
+        self._last_usage = stored["last_usage"]
+        self._hour_start = stored["hour_start"]
+        self._hour = {
+            name: _HourAccumulator(stored["hour"].get(name)) for name in self._hour
+        }
+
+    async def async_save(self) -> None:
+        await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+    @core.callback
+    def _data_to_save(self) -> Dict[str, Any]:
+        return {
+            "byteorder": sys.byteorder,
+            "series": {
+                name: base64.b64encode(self._ordered(name).tobytes()).decode()
+                for name in SERIES
+            },
+            "usage_sum": self._usage_sum,
+            "last_usage": self._last_usage,
+            "hour_start": self._hour_start,
+            "hour": {name: acc.as_dict() for name, acc in self._hour.items()},
+        }
+
+    @core.callback
+    def async_append(self, data: AquastillaSoftenerData) -> None:
+        """Record a snapshot, ignoring ones already seen."""
+        timestamp = data.timestamp.timestamp()
+        last = self.last_timestamp
+        if last is not None and timestamp <= last:
+            return
+
+        hour_start = timestamp - timestamp % HOUR
+        if self._hour_start is not None and hour_start > self._hour_start:
+            self._async_import_hour()
+        if self._hour_start != hour_start:
+            self._hour_start = hour_start
+            self._hour = {name: _HourAccumulator() for name in self._hour}
+
+        usage = data.today_water_usage_liters
+        if self._last_usage is not None:
+            delta = usage - self._last_usage
+            # The cloud counter resets at midnight.
+            self._usage_sum += delta if delta >= 0 else usage
+        self._last_usage = usage
+        self._hour["salt_level"].add(data.salt_level_percent)
+        self._hour["water_available"].add(data.water_available_liters)
+
+        index = self._next
+        self._series["timestamp"][index] = timestamp
+        self._series["water_usage"][index] = usage
+        self._series["salt_level"][index] = data.salt_level_percent
+        self._series["water_available"][index] = data.water_available_liters
+        self._next = (index + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+        self._store.async_delay_save(self._data_to_save, HISTORY_SAVE_DELAY)
+
+    @core.callback
+    def _async_import_hour(self) -> None:
+        """Push the finished hour to long-term statistics."""
+        if "recorder" not in self._hass.config.components:
+            return
+        from homeassistant.components.recorder.models import (
+            StatisticData,
+            StatisticMetaData,
+        )
+        from homeassistant.components.recorder.statistics import (
+            async_add_external_statistics,
+        )
+
+        start = dt_util.utc_from_timestamp(self._hour_start)
+        name = self._device["model"]["model"]
+        async_add_external_statistics(
+            self._hass,
+            StatisticMetaData(
+                has_mean=False,
+                has_sum=True,
+                name=f"{name} water usage",
+                source=DOMAIN,
+                statistic_id=f"{DOMAIN}:water_usage_{self._object_id}",
+                unit_of_measurement=UnitOfVolume.LITERS,
+            ),
+            [StatisticData(start=start, state=self._last_usage, sum=self._usage_sum)],
+        )
+        for key, label, unit in (
+            ("salt_level", "salt level", PERCENTAGE),
+            ("water_available", "available water", UnitOfVolume.LITERS),
+        ):
+            acc = self._hour[key]
+            if not acc.count:
+                continue
+            async_add_external_statistics(
+                self._hass,
+                StatisticMetaData(
+                    has_mean=True,
+                    has_sum=False,
+                    name=f"{name} {label}",
+                    source=DOMAIN,
+                    statistic_id=f"{DOMAIN}:{key}_{self._object_id}",
+                    unit_of_measurement=unit,
+                ),
+                [
+                    StatisticData(
+                        start=start,
+                        mean=acc.total / acc.count,
+                        min=acc.min,
+                        max=acc.max,
+                    )
+                ],
+            )
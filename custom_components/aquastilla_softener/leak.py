@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from homeassistant import core
+from homeassistant.const import STATE_ON
+from homeassistant.core import Event, callback
+from homeassistant.helpers.event import async_track_state_change_event
+
+from aquastilla_softener import AquastillaSoftenerData
+
+from .commands import COMMAND_CLOSE_VALVE
+from .const import (
+    DOMAIN,
+    CONF_LEAK_SENSORS,
+    CONF_LEAK_MAX_FLOW,
+    CONF_LEAK_FLOW_MINUTES,
+    DEFAULT_LEAK_MAX_FLOW,
+    DEFAULT_LEAK_FLOW_MINUTES,
+)
+from .coordinator import AquastillaSoftenerCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+EVENT_LEAK_DETECTED = f"{DOMAIN}_leak_detected"
+EVENT_VALVE_CLOSED = f"{DOMAIN}_valve_closed"
+EVENT_VALVE_CLOSE_FAILED = f"{DOMAIN}_valve_close_failed"
+
+SOURCE_FLOW = "flow"
+# Seconds from each close command to reading the valve back; a read-back
+# that still finds it open sends the command again.
+CONFIRM_DELAYS = (1, 2, 5, 10, 30, 60)
+# AquastillaSoftenerData fields flow detection reads.
+FLOW_FIELDS = ("timestamp", "today_water_usage", "water_available")
+# Read back only while a response runs; it needs the settings request.
+CONFIRM_FIELDS = ("water_flow",)
+
+
+def _elapsed_ms(start: float) -> int:
+    return round((time.monotonic() - start) * 1000)
+
+
+class AquastillaSoftenerLeakResponder:
+    """Close the valve of one softener as soon as a leak is detected.
+
+    Two detectors feed it. Moisture sensors picked in the options trigger it
+    when they turn on. Flow detection works out litres per minute from
+    consecutive snapshots and triggers once at least ``max_flow`` has been
+    drawn without a break for ``flow_minutes``.
+
+    A detection sends close_water_valve through the device's command queue,
+    where it overtakes other commands and skips the rate limit, and over
+    the LAN when the device has a local connection. The valve is then read
+    back after each of ``CONFIRM_DELAYS``, sending the command again while
+    it still reports flow. Read-backs go through even while the circuit
+    breaker holds polls back. Detections during a response join it. Each step
+    is timed from the detection; the timings go out with the result event
+    and stay in ``last_response`` for diagnostics.
+    """
+
+    def __init__(
+        self,
+        hass: core.HomeAssistant,
+        coordinator: AquastillaSoftenerCoordinator,
+        device: dict,
+    ):
+        self._hass = hass
+        self._coordinator = coordinator
+        self._device = device
+        self._sensors: List[str] = []
+        self._max_flow: float = DEFAULT_LEAK_MAX_FLOW
+        self._flow_minutes: int = DEFAULT_LEAK_FLOW_MINUTES
+        self._unsubs: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._sources: List[str] = []
+        self._last_sample: Optional[AquastillaSoftenerData] = None
+        self._flow_since: Optional[datetime] = None
+        self.detections = 0
+        self.last_response: Optional[Dict[str, Any]] = None
+
+    @callback
+    def async_set_options(self, options: Mapping[str, Any]) -> None:
+        """Arm the detectors the entry options turn on, disarming the rest."""
+        self._async_disarm()
+        self._sensors = list(options.get(CONF_LEAK_SENSORS, []))
+        self._max_flow = options.get(CONF_LEAK_MAX_FLOW, DEFAULT_LEAK_MAX_FLOW)
+        self._flow_minutes = options.get(CONF_LEAK_FLOW_MINUTES, DEFAULT_LEAK_FLOW_MINUTES)
+        if self._sensors:
+            self._unsubs.append(
+                async_track_state_change_event(
+                    self._hass, self._sensors, self._async_moisture_changed
+                )
+            )
+        if self._max_flow:
+            self._unsubs.append(
+                self._coordinator.async_subscribe_fields(self._device["uuid"], FLOW_FIELDS)
+            )
+            self._unsubs.append(
+                self._coordinator.async_add_listener(self._async_coordinator_updated)
+            )
+
+    @callback
+    def _async_disarm(self) -> None:
+        while self._unsubs:
+            self._unsubs.pop()()
+        self._last_sample = None
+        self._flow_since = None
+
+    @callback
+    def async_stop(self) -> None:
+        self._async_disarm()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @callback
+    def _async_moisture_changed(self, event: Event) -> None:
+        new_state = event.data["new_state"]
+        old_state = event.data["old_state"]
+        if new_state is None or new_state.state != STATE_ON:
+            return
+        if old_state is None or old_state.state != STATE_ON:
+            self.async_trigger(new_state.entity_id)
+
+    @callback
+    def _async_coordinator_updated(self) -> None:
+        uuid = self._device["uuid"]
+        if not self._coordinator.device_changed(uuid, ("timestamp",)):
+            return
+        data = self._coordinator.device_data(uuid)
+        previous, self._last_sample = self._last_sample, data
+        if previous is None or data is None:
+            return
+        minutes = (data.timestamp - previous.timestamp).total_seconds() / 60
+        if minutes <= 0:
+            return
+        used = data.today_water_usage_liters - previous.today_water_usage_liters
+        if used < 0:
+            # The daily counter went back to zero at midnight; the water left
+            # until regeneration drops by the same amount.
+            used = previous.water_available_liters - data.water_available_liters
+        if used <= 0 or used / minutes < self._max_flow:
+            self._flow_since = None
+            return
+        if self._flow_since is None:
+            self._flow_since = previous.timestamp
+        if data.timestamp - self._flow_since >= timedelta(minutes=self._flow_minutes):
+            self._flow_since = None
+            self.async_trigger(SOURCE_FLOW)
+
+    @callback
+    def async_trigger(self, source: str) -> None:
+        """Close the valve because of a leak reported by ``source``."""
+        detected = time.monotonic()
+        uuid = self._device["uuid"]
+        self.detections += 1
+        if self._task is None:
+            self._sources = [source]
+            # Started before anything else is done with the detection.
+            self._task = self._hass.async_create_background_task(
+                self._async_respond(detected), f"{DOMAIN} leak response {uuid}"
+            )
+        elif source not in self._sources:
+            self._sources.append(source)
+        _LOGGER.warning("Leak detected at %s by %s, closing the water valve", uuid, source)
+        self._hass.bus.async_fire(
+            EVENT_LEAK_DETECTED, {"device_uuid": uuid, "source": source}
+        )
+
+    async def _async_respond(self, detected: float) -> None:
+        uuid = self._device["uuid"]
+        response: Dict[str, Any] = {
+            "sources": self._sources,
+            "started_ms": _elapsed_ms(detected),
+            "attempts": 0,
+            "command_ms": None,
+            "confirmed_ms": None,
+            "closed": False,
+        }
+        unsubscribe = self._coordinator.async_subscribe_fields(uuid, CONFIRM_FIELDS)
+        try:
+            for delay in CONFIRM_DELAYS:
+                response["attempts"] += 1
+                try:
+                    # The read-back below confirms it; no account refresh.
+                    await self._coordinator.async_send_command(
+                        uuid, COMMAND_CLOSE_VALVE, confirm=False
+                    )
+                except Exception as err:
+                    _LOGGER.warning(
+                        "Closing the water valve of %s failed (attempt %d): %s",
+                        uuid,
+                        response["attempts"],
+                        err,
+                    )
+                else:
+                    if response["command_ms"] is None:
+                        response["command_ms"] = _elapsed_ms(detected)
+                await asyncio.sleep(delay)
+                # Read back even while the breaker holds polls back.
+                data = await self._coordinator.async_read_back(uuid)
+                if data is not None and data.water_flow is False:
+                    response["confirmed_ms"] = _elapsed_ms(detected)
+                    response["closed"] = True
+                    break
+        finally:
+            unsubscribe()
+            self._task = None
+            self.last_response = response
+
+        if response["closed"]:
+            _LOGGER.warning(
+                "Water valve of %s closed %d ms after the leak was detected",
+                uuid,
+                response["confirmed_ms"],
+            )
+        else:
+            _LOGGER.error(
+                "Water valve of %s still open after %d attempts", uuid, response["attempts"]
+            )
+        self._hass.bus.async_fire(
+            EVENT_VALVE_CLOSED if response["closed"] else EVENT_VALVE_CLOSE_FAILED,
+            {"device_uuid": uuid, **response},
+        )
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {
+            "moisture_sensors": len(self._sensors),
+            "max_flow": self._max_flow,
+            "flow_minutes": self._flow_minutes,
+            "flow_since": None if self._flow_since is None else self._flow_since.isoformat(),
+            "responding": self._task is not None,
+            "detections": self.detections,
+            "last_response": self.last_response,
+        }
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from typing import Any, Collection, Dict, Optional
+
+import aiohttp
+from aquastilla_softener import AquastillaSoftenerData
+
+from .api import (
+    AquastillaSoftenerApiError,
+    AquastillaSoftenerApiStats,
+    AquastillaSoftenerConnectionError,
+    parse_device_data,
+)
+from .const import (
+    DEFAULT_LOCAL_PORT,
+    LOCAL_CONNECT_TIMEOUT,
+    LOCAL_READ_TIMEOUT,
+    LOCAL_RETRY_INTERVAL,
+)
+from .transport import AquastillaSoftenerTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AquastillaSoftenerLocalApi(AquastillaSoftenerTransport):
+    """Client for the HTTP interface of a softener on the LAN.
+
+    The device serves the same payloads as the cloud, without
+    authentication:
+    - ``GET /api/state`` returns ``{"state": ..., "settings": ...}``, shaped
+      like the cloud's ``state`` and ``settings`` responses
+    - ``POST /api/<command>`` takes the same body as the cloud command
+    Timeouts are short, so an unreachable device fails within a couple of
+    seconds and the caller can fall back to the cloud.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        host: str,
+        port: int = DEFAULT_LOCAL_PORT,
+    ):
+        self._session = session
+        self._base_url = f"http://{host}:{port}"
+        self._timeout = aiohttp.ClientTimeout(
+            total=LOCAL_CONNECT_TIMEOUT + LOCAL_READ_TIMEOUT,
+            connect=LOCAL_CONNECT_TIMEOUT,
+            sock_read=LOCAL_READ_TIMEOUT,
+        )
+        self.stats = AquastillaSoftenerApiStats()
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    async def _request(self, method: str, path: str, data: Optional[str] = None) -> Any:
+        started = time.monotonic()
+        try:
+            async with self._session.request(
+                method,
+                f"{self._base_url}{path}",
+                data=data,
+                headers={"Content-Type": "application/json"} if data is not None else None,
+                timeout=self._timeout,
+            ) as response:
+                self.stats.record(started, response.status == 200)
+                if response.status != 200:
+                    raise AquastillaSoftenerApiError(
+                        f"Local {method} {path} failed: {response.status}"
+                    )
+                if method == "GET":
+                    return await response.json(content_type=None)
+                return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self.stats.record(started, False)
+            raise AquastillaSoftenerConnectionError(
+                f"Local {method} {path} failed: {err!r}"
+            ) from err
+
+    async def get_device_data(
+        self, device: Dict, fields: Optional[Collection[str]] = None
+    ) -> AquastillaSoftenerData:
+        # The device answers with everything in one request.
+        payload = await self._request("GET", "/api/state")
+        return parse_device_data(device, payload["state"], payload["settings"])
+
+    async def close_water_valve(self, device: Dict) -> None:
+        await self._request("POST", "/api/water_flow", str(0))
+
+    async def postpone_regeneration(self, device: Dict) -> None:
+        await self._request("POST", "/api/delay_regeneration", "")
+
+    async def force_regeneration(self, device: Dict) -> None:
+        await self._request("POST", "/api/force_regeneration", "")
+
+    async def set_vacation_mode(self, device: Dict, value: int) -> None:
+        await self._request("POST", "/api/vacation_mode", str(value))
+
+
+class AquastillaSoftenerFailoverTransport(AquastillaSoftenerTransport):
+    """Use the local connection of a device, and the cloud while it is away.
+
+    Only a connection failure counts as the device being away. It then
+    skips the local attempt for ``LOCAL_RETRY_INTERVAL`` seconds, so a
+    softener taken off the network costs one short timeout per interval
+    instead of one per request. Errors the device itself reports are raised
+    as is, so a command the device refused is never replayed to the cloud.
+    """
+
+    def __init__(
+        self,
+        local: AquastillaSoftenerLocalApi,
+        cloud: AquastillaSoftenerTransport,
+        retry_interval: float = LOCAL_RETRY_INTERVAL,
+    ):
+        self.local = local
+        self.cloud = cloud
+        self._retry_interval = retry_interval
+        self._local_down_until: Optional[float] = None
+
+    @property
+    def local_available(self) -> bool:
+        return self._local_down_until is None or time.monotonic() >= self._local_down_until
+
+    async def _call(self, name: str, *args: Any) -> Any:
+        if self.local_available:
+            try:
+                result = await getattr(self.local, name)(*args)
+            except AquastillaSoftenerConnectionError as err:
+                if self._local_down_until is None:
+                    _LOGGER.info(
+                        "Softener at %s unreachable, using the cloud: %s",
+                        self.local.base_url,
+                        err,
+                    )
+                self._local_down_until = time.monotonic() + self._retry_interval
+            else:
+                if self._local_down_until is not None:
+                    _LOGGER.info("Softener at %s reachable again", self.local.base_url)
+                    self._local_down_until = None
+                return result
+        return await getattr(self.cloud, name)(*args)
+
+    async def get_device_data(
+        self, device: Dict, fields: Optional[Collection[str]] = None
+    ) -> AquastillaSoftenerData:
+        return await self._call("get_device_data", device, fields)
+
+    async def close_water_valve(self, device: Dict) -> None:
+        await self._call("close_water_valve", device)
+
+    async def postpone_regeneration(self, device: Dict) -> None:
+        await self._call("postpone_regeneration", device)
+
+    async def force_regeneration(self, device: Dict) -> None:
+        await self._call("force_regeneration", device)
+
+    async def set_vacation_mode(self, device: Dict, value: int) -> None:
+        await self._call("set_vacation_mode", device, value)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {
+            "local_available": self.local_available,
+            "local": self.local.stats.as_dict(),
+        }
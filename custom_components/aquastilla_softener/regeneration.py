@@ -0,0 +1,174 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from aquastilla_softener import AquastillaSoftenerData, AquastillaSoftenerState
+from homeassistant import core
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+
+from .const import DOMAIN, REGENERATION_STORAGE_VERSION
+
+EVENT_REGENERATION_STARTED = f"{DOMAIN}_regeneration_started"
+EVENT_REGENERATION_PHASE = f"{DOMAIN}_regeneration_phase"
+EVENT_REGENERATION_FINISHED = f"{DOMAIN}_regeneration_finished"
+
+# Regeneration phases in the order the softener runs them.
+PHASES = {
+    AquastillaSoftenerState.BRINEREFILL: "brine_refill",
+    AquastillaSoftenerState.SALTDISSOLVE: "salt_dissolve",
+    AquastillaSoftenerState.REGENBACKWASH: "backwash",
+    AquastillaSoftenerState.BRINECOLLECT: "brine_collect",
+    AquastillaSoftenerState.FASTWASH: "fast_wash",
+}
+# Seconds to batch updates before the tracker state is written to disk.
+REGENERATION_SAVE_DELAY = 60
+
+
+def _seconds(start: datetime, end: datetime) -> float:
+    return max(0.0, (end - start).total_seconds())
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return None if value is None else value.isoformat()
+
+
+def _fromisoformat(value: Optional[str]) -> Optional[datetime]:
+    return None if value is None else datetime.fromisoformat(value)
+
+
+class AquastillaSoftenerRegenerationTracker:
+    """State machine following the regeneration cycles of one device.
+
+    Each snapshot's state is compared with the previous one, which gives the
+    start of a cycle, its phase changes and its end. The coordinator polls at
+    its minimum interval while a cycle runs, and phase durations run from the
+    first snapshot in a phase to the first one after it, so they are exact
+    to one polling interval. Water per cycle is the drop in available water
+    from the end of one regeneration to the start of the next.
+
+    Only the running cycle and the last results are kept. They are stored,
+    so a restart in the middle of a cycle carries on with it. Offline
+    snapshots are skipped rather than ending a cycle.
+    """
+
+    def __init__(self, hass: core.HomeAssistant, device: dict):
+        self._hass = hass
+        self._device = device
+        self._store = Store(
+            hass,
+            REGENERATION_STORAGE_VERSION,
+            f"{DOMAIN}.{slugify(device['uuid'])}_regeneration",
+        )
+        self.phase: Optional[str] = None
+        self._phase_start: Optional[datetime] = None
+        self._cycle_start: Optional[datetime] = None
+        self._cycle_phases: Dict[str, float] = {}
+        # Water available when the last cycle ended
+        self._available_after: Optional[float] = None
+        # Results of the last cycle; a phase keeps its last measured duration
+        self.phase_durations: Dict[str, float] = {}
+        self.cycle_duration: Optional[float] = None
+        self.liters_per_cycle: Optional[float] = None
+
+    async def async_load(self) -> None:
+        stored = await self._store.async_load()
+        if not stored:
+            return
+        self.phase = stored["phase"]
+        self._phase_start = _fromisoformat(stored["phase_start"])
+        self._cycle_start = _fromisoformat(stored["cycle_start"])
+        self._cycle_phases = stored["cycle_phases"]
+        self._available_after = stored["available_after"]
+        self.phase_durations = stored["phase_durations"]
+        self.cycle_duration = stored["cycle_duration"]
+        self.liters_per_cycle = stored["liters_per_cycle"]
+
+    async def async_save(self) -> None:
+        await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+    @core.callback
+    def _data_to_save(self) -> Dict[str, Any]:
+        return {
+            "phase": self.phase,
+            "phase_start": _isoformat(self._phase_start),
+            "cycle_start": _isoformat(self._cycle_start),
+            "cycle_phases": self._cycle_phases,
+            "available_after": self._available_after,
+            "phase_durations": self.phase_durations,
+            "cycle_duration": self.cycle_duration,
+            "liters_per_cycle": self.liters_per_cycle,
+        }
+
+    @core.callback
+    def async_update(self, data: AquastillaSoftenerData) -> None:
+        if data.state == AquastillaSoftenerState.OFFLINE:
+            return
+        phase = PHASES.get(data.state)
+        if phase == self.phase:
+            return
+        now = data.timestamp
+        previous = self.phase
+        previous_duration = None
+        if previous is not None:
+            previous_duration = _seconds(self._phase_start, now)
+            self._cycle_phases[previous] = previous_duration
+            self.phase_durations[previous] = previous_duration
+        self.phase = phase
+        self._phase_start = now if phase is not None else None
+
+        if phase is not None and self._cycle_start is None:
+            self._start_cycle(now, data)
+        elif phase is None and self._cycle_start is not None:
+            self._finish_cycle(now, data)
+        else:
+            self._hass.bus.async_fire(
+                EVENT_REGENERATION_PHASE,
+                {
+                    "device_uuid": self._device["uuid"],
+                    "phase": phase,
+                    "previous_phase": previous,
+                    "previous_duration": previous_duration,
+                },
+            )
+        self._store.async_delay_save(self._data_to_save, REGENERATION_SAVE_DELAY)
+
+    def _start_cycle(self, now: datetime, data: AquastillaSoftenerData) -> None:
+        self._cycle_start = now
+        self._cycle_phases = {}
+        # Before the first tracked cycle, assume the last one refilled the
+        # softener to capacity.
+        available_after = self._available_after
+        if available_after is None:
+            available_after = data.max_water_capacity_liters
+        self.liters_per_cycle = round(
+            max(0.0, available_after - data.water_available_liters)
+        )
+        self._hass.bus.async_fire(
+            EVENT_REGENERATION_STARTED,
+            {
+                "device_uuid": self._device["uuid"],
+                "phase": self.phase,
+                "liters_since_last": self.liters_per_cycle,
+            },
+        )
+
+    def _finish_cycle(self, now: datetime, data: AquastillaSoftenerData) -> None:
+        started = self._cycle_start
+        self.cycle_duration = _seconds(started, now)
+        self._cycle_start = None
+        self._available_after = data.water_available_liters
+        self._hass.bus.async_fire(
+            EVENT_REGENERATION_FINISHED,
+            {
+                "device_uuid": self._device["uuid"],
+                "started": started.isoformat(),
+                "duration": self.cycle_duration,
+                "phases": dict(self._cycle_phases),
+            },
+        )
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return self._data_to_save()
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Set
+
+# Cloud requests the whole integration has open at once, across accounts.
+MAX_IN_FLIGHT_REQUESTS = 8
+
+
+class AquastillaSoftenerScheduler:
+    """Spread the polls of every account over time and cap cloud requests.
+
+    Each registered poller gets an evenly spaced phase within its polling
+    interval, by the position of its key among the sorted keys, and polls on
+    the wall-clock slots ``phase + k * interval`` instead of an interval
+    after whenever it happened to start. Phases therefore survive restarts
+    while the same accounts are set up, and they only shift when an account
+    is added or removed.
+
+    Used as an async context manager around a cloud request, it also holds
+    the request until fewer than ``max_in_flight`` are open, so bursts such
+    as the first refresh after a restart queue up instead of reaching the
+    cloud at once.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT_REQUESTS):
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self._keys: Set[str] = set()
+
+    def register(self, key: str) -> Callable[[], None]:
+        """Give ``key`` a phase; returns a callable that releases it."""
+        self._keys.add(key)
+        return lambda: self._keys.discard(key)
+
+    def phase(self, key: str) -> float:
+        """Return the fraction of an interval at which ``key`` polls."""
+        keys = sorted(self._keys | {key})
+        # Centred in its share of the interval, so a lone poller does not
+        # land on the minute boundaries either.
+        return (keys.index(key) + 0.5) / len(keys)
+
+    def delay(self, key: str, interval: float) -> float:
+        """Return the seconds until the next slot of ``key``.
+
+        Slots closer than half an interval are skipped, so a poll that ran
+        off-slot, say to confirm a command, is not followed by another
+        straight away.
+        """
+        offset = self.phase(key) * interval
+        delay = interval - (time.time() - offset) % interval
+        if delay < interval / 2:
+            delay += interval
+        return delay
+
+    async def __aenter__(self) -> None:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {
+            "pollers": len(self._keys),
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+        }
@@ -1,41 +1,202 @@
-from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
+from abc import abstractmethod
+from dataclasses import dataclass
 import logging
-from typing import Optional
-from homeassistant.helpers.device_registry import DeviceInfo
+from typing import Any, Callable, Optional
 from homeassistant.core import callback
-from homeassistant.helpers.update_coordinator import (
-    DataUpdateCoordinator,
-    UpdateFailed,
-    CoordinatorEntity,
-)
-from homeassistant.helpers.update_coordinator import (
-    DataUpdateCoordinator,
-    UpdateFailed,
-    CoordinatorEntity,
-)
 
-from aquastilla_softener import (
-    AquastillaSoftener,
-    AquastillaSoftenerData,
-    AquastillaSoftenerState,
-)
+from aquastilla_softener import AquastillaSoftenerData
 
 from homeassistant import config_entries, core
 from homeassistant.components.sensor import (
-    SensorEntity,
+    RestoreSensor,
     SensorDeviceClass,
     SensorStateClass,
     SensorEntityDescription,
 )
-from homeassistant.const import PERCENTAGE, UnitOfVolume
-
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE
+from homeassistant.const import EntityCategory, PERCENTAGE, UnitOfTime, UnitOfVolume
+
+from .const import (
+    DOMAIN,
+    CONF_DEVICE,
+    SENSOR_GROUP_WATER,
+    SENSOR_GROUP_SALT,
+    SENSOR_GROUP_REGENERATION,
+    SENSOR_GROUP_FIRMWARE,
+    SENSOR_GROUP_DIAGNOSTICS,
+)
 from .coordinator import AquastillaSoftenerCoordinator
+from .entity import (
+    AquastillaSoftenerEntity,
+    AquastillaSoftenerEntityDescription,
+    async_add_group_entities,
+)
+from .forecast import AquastillaSoftenerForecast
+from .regeneration import PHASES, AquastillaSoftenerRegenerationTracker
 
 _LOGGER = logging.getLogger(__name__)
 
-UPDATE_INTERVAL = timedelta(minutes=1)
+# Raw device states and the translation keys they are shown as.
+STATE_MAP = {
+    "deviceStateRegenBrineRefill": "brine_refill",
+    "deviceStateRegenSaltDissolve": "salt_dissolve",
+    "deviceStateRegenBackwash": "backwash",
+    "deviceStateRegenBrineCollect": "brine_collect",
+    "deviceStateRegenFastwash": "fast_wash",
+    "deviceStateSoftening": "softening"
+}
+
+# Salt level icons, for levels above each threshold in percent.
+SALT_LEVEL_ICONS = (
+    (75, "mdi:signal-cellular-3"),
+    (50, "mdi:signal-cellular-2"),
+    (25, "mdi:signal-cellular-1"),
+    (5, "mdi:signal-cellular-outline"),
+)
+
+
+def _salt_level_icon(value: Optional[float]) -> str:
+    if value is None:
+        return "mdi:signal"
+    return next(
+        (icon for threshold, icon in SALT_LEVEL_ICONS if value > threshold),
+        "mdi:signal-off",
+    )
+
+
+def _milliseconds(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else round(seconds * 1000)
+
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerSensorEntityDescription(
+    SensorEntityDescription, AquastillaSoftenerEntityDescription
+):
+    value_fn: Callable[[AquastillaSoftenerData], Any]
+    # Picks the icon for the current value
+    icon_fn: Optional[Callable[[Any], str]] = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerForecastSensorEntityDescription(
+    SensorEntityDescription, AquastillaSoftenerEntityDescription
+):
+    value_fn: Callable[[AquastillaSoftenerForecast], Any]
+    # The forecast is refreshed for every new snapshot.
+    fields: tuple[str, ...] = ("timestamp",)
+
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerRegenerationSensorEntityDescription(
+    SensorEntityDescription, AquastillaSoftenerEntityDescription
+):
+    value_fn: Callable[[AquastillaSoftenerRegenerationTracker], Any]
+    # The tracker only moves on when the device state changes.
+    fields: tuple[str, ...] = ("state",)
+    group: Optional[str] = SENSOR_GROUP_REGENERATION
+
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerDiagnosticSensorEntityDescription(
+    SensorEntityDescription, AquastillaSoftenerEntityDescription
+):
+    # Called with the coordinator and the device uuid
+    value_fn: Callable[[AquastillaSoftenerCoordinator, str], Any]
+    # Also refresh when the device's command queue moves
+    follows_command_queue: bool = False
+    entity_category: EntityCategory = EntityCategory.DIAGNOSTIC
+    entity_registry_enabled_default: bool = False
+    group: Optional[str] = SENSOR_GROUP_DIAGNOSTICS
+
+
+SENSOR_DESCRIPTIONS = (
+    AquastillaSoftenerSensorEntityDescription(
+        key="State", translation_key="state",
+        fields=("state",), value_fn=lambda data: STATE_MAP.get(data.state.value, data.state.value)),
+    AquastillaSoftenerSensorEntityDescription(
+        key="SALT_LEVEL", translation_key="salt_level", state_class=SensorStateClass.MEASUREMENT, native_unit_of_measurement=PERCENTAGE,
+        group=SENSOR_GROUP_SALT, fields=("salt_level_percent",), value_fn=lambda data: data.salt_level_percent, icon_fn=_salt_level_icon),
+    AquastillaSoftenerSensorEntityDescription(
+        key="AVAILABLE_WATER", translation_key="available_water", state_class=SensorStateClass.TOTAL, device_class=SensorDeviceClass.WATER, native_unit_of_measurement=UnitOfVolume.LITERS, icon="mdi:water",
+        group=SENSOR_GROUP_WATER, fields=("water_available",), value_fn=lambda data: data.water_available_liters),
+    AquastillaSoftenerSensorEntityDescription(
+        key="WATER_USAGE_TODAY", translation_key="water_usage_today", state_class=SensorStateClass.TOTAL_INCREASING, device_class=SensorDeviceClass.WATER, native_unit_of_measurement=UnitOfVolume.LITERS, icon="mdi:water-minus",
+        group=SENSOR_GROUP_WATER, fields=("today_water_usage",), value_fn=lambda data: data.today_water_usage_liters),
+    AquastillaSoftenerSensorEntityDescription(
+        key="EXPECTED_REGENERATION_DATE", translation_key="expected_regeneration_date", device_class=SensorDeviceClass.TIMESTAMP,
+        group=SENSOR_GROUP_REGENERATION, fields=("expected_regeneration_date",), value_fn=lambda data: data.expected_regeneration_date),
+    AquastillaSoftenerSensorEntityDescription(
+        key="LAST_REGENERATION", translation_key="last_regeneration", device_class=SensorDeviceClass.TIMESTAMP,
+        group=SENSOR_GROUP_REGENERATION, fields=("last_regeneration",), value_fn=lambda data: data.last_regeneration),
+    AquastillaSoftenerSensorEntityDescription(
+        key="SALT_DAYS_REMAINING", translation_key="salt_days_remaining", state_class=SensorStateClass.MEASUREMENT, icon="mdi:calendar-clock",
+        group=SENSOR_GROUP_SALT, fields=("salt_days_remaining",), value_fn=lambda data: data.salt_days_remaining),
+    AquastillaSoftenerSensorEntityDescription(
+        key="SALT_DAYS_MAX", translation_key="salt_days_max", state_class=SensorStateClass.MEASUREMENT, icon="mdi:calendar-range",
+        group=SENSOR_GROUP_SALT, fields=("salt_days_max",), value_fn=lambda data: data.salt_days_max),
+    AquastillaSoftenerSensorEntityDescription(
+        key="REGEN_PERCENTAGE", translation_key="regen_percentage", state_class=SensorStateClass.MEASUREMENT, native_unit_of_measurement=PERCENTAGE, icon="mdi:restore",
+        group=SENSOR_GROUP_REGENERATION, fields=("regen_percentage",), value_fn=lambda data: data.regen_percentage),
+    AquastillaSoftenerSensorEntityDescription(
+        key="FIRMWARE_UPGRADE_PERCENTAGE", translation_key="firmware_upgrade_percentage", state_class=SensorStateClass.MEASUREMENT, native_unit_of_measurement=PERCENTAGE, icon="mdi:download",
+        group=SENSOR_GROUP_FIRMWARE, fields=("firmware_upgrade_percentage",), value_fn=lambda data: data.firmware_upgrade_percentage),
+)
+
+FORECAST_SENSOR_DESCRIPTIONS = (
+    AquastillaSoftenerForecastSensorEntityDescription(
+        key="SALT_EMPTY_FORECAST", translation_key="salt_empty_forecast", device_class=SensorDeviceClass.TIMESTAMP, icon="mdi:shaker-outline",
+        group=SENSOR_GROUP_SALT, value_fn=lambda forecast: forecast.salt_empty),
+    AquastillaSoftenerForecastSensorEntityDescription(
+        key="LITERS_UNTIL_REGENERATION", translation_key="liters_until_regeneration", device_class=SensorDeviceClass.WATER, native_unit_of_measurement=UnitOfVolume.LITERS, icon="mdi:water-sync",
+        group=SENSOR_GROUP_WATER, value_fn=lambda forecast: forecast.liters_until_regeneration),
+)
+
+REGENERATION_SENSOR_DESCRIPTIONS = (
+    *(
+        AquastillaSoftenerRegenerationSensorEntityDescription(
+            key=f"{phase.upper()}_DURATION", translation_key=f"{phase}_duration", state_class=SensorStateClass.MEASUREMENT, device_class=SensorDeviceClass.DURATION, native_unit_of_measurement=UnitOfTime.SECONDS, suggested_unit_of_measurement=UnitOfTime.MINUTES, icon="mdi:timer-sync-outline",
+            value_fn=lambda tracker, phase=phase: tracker.phase_durations.get(phase))
+        for phase in PHASES.values()
+    ),
+    AquastillaSoftenerRegenerationSensorEntityDescription(
+        key="REGENERATION_DURATION", translation_key="regeneration_duration", state_class=SensorStateClass.MEASUREMENT, device_class=SensorDeviceClass.DURATION, native_unit_of_measurement=UnitOfTime.SECONDS, suggested_unit_of_measurement=UnitOfTime.MINUTES, icon="mdi:timer-refresh-outline",
+        value_fn=lambda tracker: tracker.cycle_duration),
+    AquastillaSoftenerRegenerationSensorEntityDescription(
+        key="LITERS_PER_CYCLE", translation_key="liters_per_cycle", device_class=SensorDeviceClass.WATER, native_unit_of_measurement=UnitOfVolume.LITERS, icon="mdi:water-circle",
+        value_fn=lambda tracker: tracker.liters_per_cycle),
+)
+
+DIAGNOSTIC_SENSOR_DESCRIPTIONS = (
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="CLOUD_LATENCY_P50", translation_key="cloud_latency_p50", state_class=SensorStateClass.MEASUREMENT, device_class=SensorDeviceClass.DURATION, native_unit_of_measurement=UnitOfTime.MILLISECONDS, icon="mdi:timer-outline",
+        value_fn=lambda coordinator, uuid: _milliseconds(coordinator.api.stats.latency_percentile(50))),
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="CLOUD_LATENCY_P95", translation_key="cloud_latency_p95", state_class=SensorStateClass.MEASUREMENT, device_class=SensorDeviceClass.DURATION, native_unit_of_measurement=UnitOfTime.MILLISECONDS, icon="mdi:timer-alert-outline",
+        value_fn=lambda coordinator, uuid: _milliseconds(coordinator.api.stats.latency_percentile(95))),
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="CLOUD_REQUEST_SUCCESSES", translation_key="cloud_request_successes", state_class=SensorStateClass.TOTAL_INCREASING, icon="mdi:cloud-check-outline",
+        value_fn=lambda coordinator, uuid: coordinator.api.stats.requests - coordinator.api.stats.failures),
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="CLOUD_REQUEST_FAILURES", translation_key="cloud_request_failures", state_class=SensorStateClass.TOTAL_INCREASING, icon="mdi:cloud-alert",
+        value_fn=lambda coordinator, uuid: coordinator.api.stats.failures),
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="LAST_SUCCESSFUL_UPDATE", translation_key="last_successful_update", device_class=SensorDeviceClass.TIMESTAMP, icon="mdi:cloud-clock-outline",
+        value_fn=lambda coordinator, uuid: coordinator.last_success_time),
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="CLOUD_LOGINS", translation_key="cloud_logins", state_class=SensorStateClass.TOTAL_INCREASING, icon="mdi:login",
+        value_fn=lambda coordinator, uuid: coordinator.api.stats.logins),
+    # Writes made by the previous update; the current one is still in progress.
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="STATE_WRITES", translation_key="state_writes", state_class=SensorStateClass.MEASUREMENT, icon="mdi:database-edit-outline",
+        value_fn=lambda coordinator, uuid: coordinator.state_writes_per_cycle),
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="COMMAND_QUEUE_DEPTH", translation_key="command_queue_depth", state_class=SensorStateClass.MEASUREMENT, icon="mdi:tray-full",
+        follows_command_queue=True, value_fn=lambda coordinator, uuid: coordinator.command_queue(uuid).stats.depth),
+    # From queueing to the device or cloud accepting the command.
+    AquastillaSoftenerDiagnosticSensorEntityDescription(
+        key="COMMAND_LATENCY_P95", translation_key="command_latency_p95", state_class=SensorStateClass.MEASUREMENT, device_class=SensorDeviceClass.DURATION, native_unit_of_measurement=UnitOfTime.MILLISECONDS, icon="mdi:timer-sand",
+        follows_command_queue=True, value_fn=lambda coordinator, uuid: _milliseconds(coordinator.command_queue(uuid).stats.latency_percentile(95))),
+)
+
 
 async def async_setup_entry(
     hass: core.HomeAssistant,
@@ -43,158 +204,150 @@ async def async_setup_entry(
     async_add_entities,
 ):
     config = hass.data[DOMAIN][config_entry.entry_id]
-    if config_entry.options:
-        config.update(config_entry.options)
-
     device = config[CONF_DEVICE]
-
-    coordinator = AquastillaSoftenerCoordinator(
-        hass,
-        AquastillaSoftener(
-            config[CONF_USERNAME], config[CONF_PASSWORD]
-        ),
-        device,
-    )
-    await coordinator.async_config_entry_first_refresh()
-    
-    sensors = [
-        clz(coordinator, device, entity_description)
-        for clz, entity_description in (
-            (AquastillaSoftenerStateSensor, SensorEntityDescription(
-                key="State", translation_key="state")),
-            (AquastillaSoftenerSaltLevelSensor, SensorEntityDescription(
-                key="SALT_LEVEL", translation_key="salt_level", state_class=SensorStateClass.MEASUREMENT, native_unit_of_measurement=PERCENTAGE)),
-            (AquastillaSoftenerAvailableWaterSensor, SensorEntityDescription(
-                key="AVAILABLE_WATER", translation_key="available_water", state_class=SensorStateClass.TOTAL, device_class=SensorDeviceClass.WATER, icon="mdi:water")),
-            (AquastillaSoftenerWaterUsageTodaySensor, SensorEntityDescription(
-                key="WATER_USAGE_TODAY", translation_key="water_usage_today", state_class=SensorStateClass.TOTAL_INCREASING, device_class=SensorDeviceClass.WATER, icon="mdi:water-minus")),
-            (AquastillaSoftenerExpectedRegenerationSensor, SensorEntityDescription(
-                key="EXPECTED_REGENERATION_DATE", translation_key="expected_regeneration_date", device_class=SensorDeviceClass.TIMESTAMP)),
-            (AquastillaSoftenerLastRegenerationSensor, SensorEntityDescription(
-                key="LAST_REGENERATION", translation_key="last_regeneration", device_class=SensorDeviceClass.TIMESTAMP)),
-            (AquastillaSoftenerSaltDaysRemainingSensor, SensorEntityDescription(
-                key="SALT_DAYS_REMAINING", translation_key="salt_days_remaining", state_class=SensorStateClass.MEASUREMENT, icon="mdi:calendar-clock")),
-            (AquastillaSoftenerSaltDaysMaxSensor, SensorEntityDescription(
-                key="SALT_DAYS_MAX", translation_key="salt_days_max", state_class=SensorStateClass.MEASUREMENT, icon="mdi:calendar-range")),
-            (AquastillaSoftenerRegenPercentageSensor, SensorEntityDescription(
-                key="REGEN_PERCENTAGE", translation_key="regen_percentage", state_class=SensorStateClass.MEASUREMENT, native_unit_of_measurement=PERCENTAGE, icon="mdi:restore")),
-            (AquastillaSoftenerFirmwareUpgradePercentageSensor, SensorEntityDescription(
-                key="FIRMWARE_UPGRADE_PERCENTAGE", translation_key="firmware_upgrade_percentage", state_class=SensorStateClass.MEASUREMENT, native_unit_of_measurement=PERCENTAGE, icon="mdi:download"))
+    coordinator: AquastillaSoftenerCoordinator = config["coordinator"]
+
+    for descriptions, create in (
+        (SENSOR_DESCRIPTIONS, lambda description: AquastillaSoftenerSensor(
+            coordinator, device, description)),
+        (FORECAST_SENSOR_DESCRIPTIONS, lambda description: AquastillaSoftenerForecastSensor(
+            coordinator, device, description, config["forecast"])),
+        (REGENERATION_SENSOR_DESCRIPTIONS, lambda description: AquastillaSoftenerRegenerationSensor(
+            coordinator, device, description, config["regeneration"])),
+        (DIAGNOSTIC_SENSOR_DESCRIPTIONS, lambda description: AquastillaSoftenerDiagnosticSensor(
+            coordinator, device, description)),
+    ):
+        async_add_group_entities(
+            hass, config_entry, "sensor", async_add_entities, descriptions, create
         )
-    ]
 
-    async_add_entities(sensors)
+class AquastillaSoftenerSensor(AquastillaSoftenerEntity, RestoreSensor):
+    entity_description: AquastillaSoftenerSensorEntityDescription
 
-class AquastillaSoftenerSensor(SensorEntity, CoordinatorEntity, ABC):
     def __init__(
         self,
         coordinator: AquastillaSoftenerCoordinator,
         device: dict,
-        entity_description: SensorEntityDescription = None,
+        entity_description: SensorEntityDescription,
     ):
-        super().__init__(coordinator)
-        self.entity_description = entity_description
-        self._device = device
-        self._attr_unique_id = f"{device['uuid']}_{entity_description.key}"
-        self._attr_has_entity_name = True
+        super().__init__(coordinator, device, entity_description)
+        self._set_value(None)
 
     async def async_added_to_hass(self) -> None:
         await super().async_added_to_hass()
+        if self.coordinator.device_data(self._device["uuid"]) is None and (
+            last_sensor_data := await self.async_get_last_sensor_data()
+        ):
+            self._set_value(last_sensor_data.native_value)
+            self._attr_native_unit_of_measurement = (
+                last_sensor_data.native_unit_of_measurement
+            )
         self._handle_coordinator_update()
 
-    @property
-    def device_info(self) -> Optional[DeviceInfo]:
-        device = self.coordinator._device
-        if isinstance(device, dict):
-            return DeviceInfo(
-                identifiers={(DOMAIN, device["uuid"])},
-                name=device["model"]["model"],
-                serial_number=device["serial"],
-                model=device["model"]["model"],
-            )
-        return None
+    def _set_value(self, value: Any) -> None:
+        self._attr_native_value = value
+        if (icon_fn := getattr(self.entity_description, "icon_fn", None)) is not None:
+            self._attr_icon = icon_fn(value)
+
+    def update(self, data: AquastillaSoftenerData):
+        self._set_value(self.entity_description.value_fn(data))
+
+
+class AquastillaSoftenerDerivedSensor(AquastillaSoftenerSensor):
+    """A value worked out from the snapshots rather than read off one.
+
+    It changes far less often than the fields it follows, so a new snapshot
+    that leaves it and the availability as they were writes no state.
+    """
 
     @callback
     def _handle_coordinator_update(self) -> None:
-        self.update(self.coordinator.data)
-        self.async_write_ha_state()
+        if (
+            self.available == self._last_available
+            and self.value() == self._attr_native_value
+        ):
+            return
+        super()._handle_coordinator_update()
 
-    @abstractmethod
     def update(self, data: AquastillaSoftenerData):
-        ...
+        self._set_value(self.value())
 
+    @abstractmethod
+    def value(self):
+        """Return the sensor's current value."""
 
-class AquastillaSoftenerStateSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        state_map = {
-            "deviceStateRegenBrineRefill": "brine_refill",
-            "deviceStateRegenSaltDissolve": "salt_dissolve",
-            "deviceStateRegenBackwash": "backwash",
-            "deviceStateRegenBrineCollect": "brine_collect",
-            "deviceStateRegenFastwash": "fast_wash",
-            "deviceStateSoftening": "softening"
-        }
-        raw_state = data.state.value
-        self._attr_native_value = state_map.get(raw_state, raw_state)
-
-class AquastillaSoftenerSaltLevelSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.salt_level_percent
 
-    @property
-    def icon(self) -> Optional[str]:
-        if self._attr_native_value is not None:
-            if self._attr_native_value > 75:
-                return "mdi:signal-cellular-3"
-            elif self._attr_native_value > 50:
-                return "mdi:signal-cellular-2"
-            elif self._attr_native_value > 25:
-                return "mdi:signal-cellular-1"
-            elif self._attr_native_value > 5:
-                return "mdi:signal-cellular-outline"
-            return "mdi:signal-off"
-        else:
-            return "mdi:signal"
-
-
-class AquastillaSoftenerAvailableWaterSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.water_available_liters
-        self._attr_native_unit_of_measurement = UnitOfVolume.LITERS
+class AquastillaSoftenerForecastSensor(AquastillaSoftenerDerivedSensor):
+    entity_description: AquastillaSoftenerForecastSensorEntityDescription
 
+    def __init__(
+        self,
+        coordinator: AquastillaSoftenerCoordinator,
+        device: dict,
+        entity_description: AquastillaSoftenerForecastSensorEntityDescription,
+        forecast: AquastillaSoftenerForecast,
+    ):
+        super().__init__(coordinator, device, entity_description)
+        self._forecast = forecast
 
-class AquastillaSoftenerWaterUsageTodaySensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.today_water_usage_liters
-        self._attr_native_unit_of_measurement = UnitOfVolume.LITERS
+    def value(self):
+        return self.entity_description.value_fn(self._forecast)
 
 
-class AquastillaSoftenerExpectedRegenerationSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.expected_regeneration_date
+class AquastillaSoftenerRegenerationSensor(AquastillaSoftenerDerivedSensor):
+    """Results of the last regeneration cycles, from the cycle tracker."""
 
+    entity_description: AquastillaSoftenerRegenerationSensorEntityDescription
 
-class AquastillaSoftenerLastRegenerationSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.last_regeneration
+    def __init__(
+        self,
+        coordinator: AquastillaSoftenerCoordinator,
+        device: dict,
+        entity_description: AquastillaSoftenerRegenerationSensorEntityDescription,
+        tracker: AquastillaSoftenerRegenerationTracker,
+    ):
+        super().__init__(coordinator, device, entity_description)
+        self._tracker = tracker
 
+    def value(self):
+        return self.entity_description.value_fn(self._tracker)
 
-class AquastillaSoftenerSaltDaysRemainingSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.salt_days_remaining
 
+class AquastillaSoftenerDiagnosticSensor(AquastillaSoftenerSensor):
+    """Health and cost of the account's cloud connection.
 
-class AquastillaSoftenerSaltDaysMaxSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.salt_days_max
+    Read from the client and coordinator counters after every refresh,
+    including failed ones, and always available so an outage stays visible.
+    Disabled by default.
+    """
 
+    entity_description: AquastillaSoftenerDiagnosticSensorEntityDescription
 
-class AquastillaSoftenerRegenPercentageSensor(AquastillaSoftenerSensor):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.regen_percentage
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        if self.entity_description.follows_command_queue:
+            self.async_on_remove(
+                self.coordinator.command_queue(self._device["uuid"]).async_add_listener(
+                    self._handle_coordinator_update
+                )
+            )
 
+    @property
+    def available(self) -> bool:
+        return True
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        value = self.value()
+        if self._last_available and value == self._attr_native_value:
+            return
+        self._last_available = True
+        self._attr_native_value = value
+        self.async_write_ha_state()
+        self.coordinator.state_writes += 1
 
-class AquastillaSoftenerFirmwareUpgradePercentageSensor(AquastillaSoftenerSensor):
     def update(self, data: AquastillaSoftenerData):
-        self._attr_native_value = data.firmware_upgrade_percentage
+        self._attr_native_value = self.value()
 
+    def value(self):
+        return self.entity_description.value_fn(self.coordinator, self._device["uuid"])
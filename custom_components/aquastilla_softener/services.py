@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+import voluptuous as vol
+from homeassistant import core
+from homeassistant.const import ATTR_ENTITY_ID, ENTITY_MATCH_ALL
+from homeassistant.core import ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.service import async_extract_config_entry_ids
+
+from .commands import (
+    COMMAND_FORCE_REGENERATION,
+    COMMAND_POSTPONE_REGENERATION,
+    COMMAND_SET_VACATION_MODE,
+)
+from .const import DOMAIN, CONF_DEVICE
+from .coordinator import AquastillaSoftenerCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_ENABLED = "enabled"
+# Devices a single service call sends to at the same time.
+SERVICE_PARALLELISM = 4
+
+TARGET_SCHEMA = vol.Schema(cv.TARGET_SERVICE_FIELDS)
+
+
+def _targeted(schema: vol.Schema) -> vol.All:
+    # A call without a target is refused rather than sent to every softener;
+    # entity_id: all asks for that explicitly.
+    return vol.All(schema, cv.has_at_least_one_key(*cv.TARGET_SERVICE_FIELDS))
+
+
+# Services are named after the commands they send.
+SERVICE_SCHEMAS = {
+    COMMAND_FORCE_REGENERATION: _targeted(TARGET_SCHEMA),
+    COMMAND_POSTPONE_REGENERATION: _targeted(TARGET_SCHEMA),
+    COMMAND_SET_VACATION_MODE: _targeted(
+        TARGET_SCHEMA.extend({vol.Required(ATTR_ENABLED): cv.boolean})
+    ),
+}
+
+
+def _command_args(call: ServiceCall) -> tuple:
+    if call.service == COMMAND_SET_VACATION_MODE:
+        return (int(call.data[ATTR_ENABLED]),)
+    return ()
+
+
+async def _async_targets(hass: core.HomeAssistant, call: ServiceCall) -> List[Dict[str, Any]]:
+    """Return the entry data of the softeners a call targets."""
+    loaded = hass.data.get(DOMAIN, {})
+    if call.data.get(ATTR_ENTITY_ID) == ENTITY_MATCH_ALL:
+        return list(loaded.values())
+    entry_ids = await async_extract_config_entry_ids(hass, call)
+    targets = [loaded[entry_id] for entry_id in entry_ids if entry_id in loaded]
+    if not targets:
+        raise ServiceValidationError("No loaded Aquastilla softener is targeted")
+    return targets
+
+
+async def _async_handle_command(
+    hass: core.HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Send a command to every targeted softener, a few at a time.
+
+    Each device's command still goes through its own queue. Confirmation is
+    requested once per account once every device has answered, instead of
+    once per device. The response maps each device uuid to its outcome.
+    """
+    args = _command_args(call)
+    semaphore = asyncio.Semaphore(SERVICE_PARALLELISM)
+
+    async def _async_send(coordinator: AquastillaSoftenerCoordinator, uuid: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                await coordinator.async_send_command(uuid, call.service, *args, confirm=False)
+            except Exception as err:
+                _LOGGER.warning("%s failed for %s: %s", call.service, uuid, err)
+                return {"success": False, "error": str(err)}
+        return {"success": True}
+
+    targets = [
+        (hass_data["coordinator"], hass_data[CONF_DEVICE]["uuid"])
+        for hass_data in await _async_targets(hass, call)
+    ]
+    results = await asyncio.gather(
+        *(_async_send(coordinator, uuid) for coordinator, uuid in targets)
+    )
+    outcomes = list(zip(targets, results))
+    coordinators = {
+        id(coordinator): coordinator
+        for (coordinator, _uuid), result in outcomes
+        if result["success"]
+    }
+    for coordinator in coordinators.values():
+        coordinator.async_request_confirmation()
+    return {"devices": {uuid: result for (_coordinator, uuid), result in outcomes}}
+
+
+@core.callback
+def async_setup_services(hass: core.HomeAssistant) -> None:
+    """Register the bulk command services of the integration."""
+
+    async def _async_handle(call: ServiceCall) -> ServiceResponse:
+        return await _async_handle_command(hass, call)
+
+    for service, schema in SERVICE_SCHEMAS.items():
+        hass.services.async_register(
+            DOMAIN,
+            service,
+            _async_handle,
+            schema=schema,
+            supports_response=SupportsResponse.OPTIONAL,
+        )
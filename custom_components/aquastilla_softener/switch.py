@@ -1,26 +1,55 @@
+from dataclasses import dataclass
 import logging
-from abc import ABC, abstractmethod
-from datetime import timedelta
-from typing import Optional
+import math
+from typing import Callable, Optional
 
 from homeassistant.components.switch import (
     SwitchEntity,
     SwitchEntityDescription,
 )
-from homeassistant.helpers.device_registry import DeviceInfo
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-)
+from homeassistant.helpers.debounce import Debouncer
 
+from homeassistant.const import STATE_OFF, STATE_ON
 from homeassistant.core import callback
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant import config_entries, core
 
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_DEVICE
-from .coordinator import AquastillaSoftenerCoordinator
-from aquastilla_softener import AquastillaSoftener, AquastillaSoftenerData
+from .commands import COMMAND_SET_VACATION_MODE
+from .const import DOMAIN, CONF_DEVICE, SENSOR_GROUP_CONTROLS
+from .coordinator import AquastillaSoftenerCoordinator, CONFIRM_DELAY
+from .entity import (
+    AquastillaSoftenerEntity,
+    AquastillaSoftenerEntityDescription,
+    async_add_group_entities,
+)
+from aquastilla_softener import AquastillaSoftenerData
 
 _LOGGER = logging.getLogger(__name__)
-UPDATE_INTERVAL = timedelta(minutes=1)
+
+# Seconds to wait for further toggles before sending a command.
+COMMAND_DEBOUNCE = 1.0
+
+
+@dataclass(frozen=True, kw_only=True)
+class AquastillaSoftenerSwitchEntityDescription(
+    SwitchEntityDescription, AquastillaSoftenerEntityDescription
+):
+    value_fn: Callable[[AquastillaSoftenerData], bool]
+    # Command sent with the requested state as 0 or 1
+    command: str
+
+
+SWITCH_DESCRIPTIONS = (
+    AquastillaSoftenerSwitchEntityDescription(
+        key="VACATION_MODE",
+        translation_key="vacation_mode",
+        icon="mdi:beach",
+        group=SENSOR_GROUP_CONTROLS,
+        fields=("vacation_mode",),
+        value_fn=lambda data: data.vacation_mode,
+        command=COMMAND_SET_VACATION_MODE,
+    ),
+)
 
 
 async def async_setup_entry(
@@ -29,94 +58,132 @@ async def async_setup_entry(
     async_add_entities,
 ):
     config = hass.data[DOMAIN][config_entry.entry_id]
-    if config_entry.options:
-        config.update(config_entry.options)
-
     device = config[CONF_DEVICE]
+    coordinator: AquastillaSoftenerCoordinator = config["coordinator"]
 
-    coordinator = AquastillaSoftenerCoordinator(
+    async_add_group_entities(
         hass,
-        AquastillaSoftener(config[CONF_USERNAME], config[CONF_PASSWORD]),
-        device,
+        config_entry,
+        "switch",
+        async_add_entities,
+        SWITCH_DESCRIPTIONS,
+        lambda description: AquastillaSoftenerSwitch(coordinator, device, description),
     )
 
-    await coordinator.async_config_entry_first_refresh()
-
-    switches = [
-        AquastillaSoftenerVacationModeSwitch(
-            coordinator,
-            device,
-            SwitchEntityDescription(
-                key="VACATION_MODE",
-                translation_key="vacation_mode",
-                icon="mdi:beach",
-            )
-        )
-    ]
 
-    async_add_entities(switches)
+class AquastillaSoftenerSwitch(AquastillaSoftenerEntity, SwitchEntity, RestoreEntity):
+    """Switch that applies commands optimistically.
 
+    Turning the switch shows the new state at once and queues the command.
+    Toggles within ``COMMAND_DEBOUNCE`` collapse into one request carrying the
+    last requested state, which then goes through the device's command queue.
+    Once sent, the coordinator schedules one confirmation refresh. Until it
+    lands, polls that still report the old value do not flip the switch back.
+    If the command fails, or the confirmation still disagrees, the switch
+    rolls back to the value reported by the cloud.
+    """
+
+    entity_description: AquastillaSoftenerSwitchEntityDescription
 
-class AquastillaSoftenerSwitch(SwitchEntity, CoordinatorEntity, ABC):
     def __init__(
         self,
         coordinator: AquastillaSoftenerCoordinator,
         device: dict,
-        entity_description: SwitchEntityDescription,
+        entity_description: AquastillaSoftenerSwitchEntityDescription,
     ):
-        super().__init__(coordinator)
-        self.entity_description = entity_description
-        self._device = device
-        self._attr_unique_id = f"{device['uuid']}_{entity_description.key}"
-        self._attr_has_entity_name = True
+        super().__init__(coordinator, device, entity_description)
+        self._optimistic: Optional[bool] = None
+        self._optimistic_until = math.inf
+        self._command_debouncer: Optional[Debouncer] = None
 
     async def async_added_to_hass(self):
         await super().async_added_to_hass()
+        self._command_debouncer = Debouncer(
+            self.hass,
+            _LOGGER,
+            cooldown=COMMAND_DEBOUNCE,
+            immediate=False,
+            function=self._async_send_command,
+        )
+        self.async_on_remove(self._command_debouncer.async_shutdown)
+        if self.coordinator.device_data(self._device["uuid"]) is None:
+            last_state = await self.async_get_last_state()
+            if last_state is not None and last_state.state in (STATE_ON, STATE_OFF):
+                self._attr_is_on = last_state.state == STATE_ON
         self._handle_coordinator_update()
 
-    @property
-    def device_info(self) -> Optional[DeviceInfo]:
-        device = self.coordinator._device
-        if isinstance(device, dict):
-            return DeviceInfo(
-                identifiers={(DOMAIN, device["uuid"])},
-                name=device["model"]["model"],
-                serial_number=device["serial"],
-                model=device["model"]["model"],
-            )
-        return None
-
     @callback
     def _handle_coordinator_update(self) -> None:
-        self.update(self.coordinator.data)
+        # Only write state when a field this entity reads, or its
+        # availability, has changed since the previous update. A pending
+        # optimistic value always needs reconciling.
+        uuid = self._device["uuid"]
+        available = self.available
+        if (
+            self._optimistic is None
+            and available == self._last_available
+            and not self.coordinator.device_changed(uuid, self.entity_description.fields)
+        ):
+            return
+        self._last_available = available
+        data = self.coordinator.device_data(uuid)
+        if data is not None:
+            self.update(data)
         self.async_write_ha_state()
+        self.coordinator.state_writes += 1
 
-    @abstractmethod
     def update(self, data: AquastillaSoftenerData):
-        ...
-
-
-class AquastillaSoftenerVacationModeSwitch(AquastillaSoftenerSwitch):
-    def update(self, data: AquastillaSoftenerData):
-        self._attr_is_on = data.vacation_mode
+        value = self.cloud_value(data)
+        if self._optimistic is not None:
+            if value != self._optimistic and self.hass.loop.time() < self._optimistic_until:
+                return
+            if value != self._optimistic:
+                _LOGGER.warning(
+                    "%s was not confirmed by the cloud, rolling back", self.entity_id
+                )
+            self._optimistic = None
+        self._attr_is_on = value
 
     async def async_turn_on(self, **kwargs):
-        await self.hass.async_add_executor_job(
-            self.coordinator.api.set_vacation_mode,
-            self._device,
-            1
-        )
-        self._attr_is_on = True
-        self.async_write_ha_state()
-        await self.coordinator.async_request_refresh()
+        await self._async_set(True)
 
     async def async_turn_off(self, **kwargs):
-        await self.hass.async_add_executor_job(
-            self.coordinator.api.set_vacation_mode,
-            self._device,
-            0
-        )
-        self._attr_is_on = False
-        self.async_write_ha_state()
-        await self.coordinator.async_request_refresh()
+        await self._async_set(False)
 
+    async def _async_set(self, value: bool) -> None:
+        self._optimistic = value
+        self._optimistic_until = math.inf
+        self._attr_is_on = value
+        self.async_write_ha_state()
+        await self._command_debouncer.async_call()
+
+    async def _async_send_command(self) -> None:
+        value = self._optimistic
+        if value is None:
+            return
+        data = self.coordinator.device_data(self._device["uuid"])
+        if data is not None and self.cloud_value(data) == value:
+            # Toggled back to what the cloud already reports.
+            self._optimistic = None
+            return
+        try:
+            await self.async_send(value)
+        except Exception as err:
+            _LOGGER.error("Error setting %s: %s", self.entity_id, err)
+            self._optimistic = None
+            if data is not None:
+                self._attr_is_on = self.cloud_value(data)
+            self.async_write_ha_state()
+            return
+        # The command may have waited in the device's queue; polls until it
+        # went out cannot confirm it. The window closes with the confirmation
+        # refresh the command just scheduled, whose fetch lands after it.
+        self._optimistic_until = self.hass.loop.time() + CONFIRM_DELAY
+
+    def cloud_value(self, data: AquastillaSoftenerData) -> bool:
+        return self.entity_description.value_fn(data)
+
+    async def async_send(self, value: bool) -> None:
+        await self.coordinator.async_send_command(
+            self._device["uuid"], self.entity_description.command, int(value)
+        )
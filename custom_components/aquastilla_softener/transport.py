@@ -0,0 +1,40 @@
+from abc import ABC, abstractmethod
+from typing import Collection, Dict, Optional
+
+from aquastilla_softener import AquastillaSoftenerData
+
+
+class AquastillaSoftenerTransport(ABC):
+    """Reads and commands for one or more softeners over some channel.
+
+    The coordinator reads through it and entities send their commands
+    through it. Each device gets the transport that fits it: the cloud API,
+    or a local connection that falls back to the cloud.
+    """
+
+    @abstractmethod
+    async def get_device_data(
+        self, device: Dict, fields: Optional[Collection[str]] = None
+    ) -> AquastillaSoftenerData:
+        """Return a snapshot of the device.
+
+        ``fields`` names the AquastillaSoftenerData fields the caller reads,
+        or None for all of them. A transport may leave the others stale
+        when that saves a request.
+        """
+
+    @abstractmethod
+    async def close_water_valve(self, device: Dict) -> None:
+        ...
+
+    @abstractmethod
+    async def postpone_regeneration(self, device: Dict) -> None:
+        ...
+
+    @abstractmethod
+    async def force_regeneration(self, device: Dict) -> None:
+        ...
+
+    @abstractmethod
+    async def set_vacation_mode(self, device: Dict, value: int) -> None:
+        ...
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import random
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Optional
+
+from homeassistant.core import callback
+
+from .api import (
+    AquastillaSoftenerApiError,
+    AquastillaSoftenerAuthError,
+    AquastillaSoftenerNotFoundError,
+    AquastillaSoftenerRateLimitError,
+)
+
+if TYPE_CHECKING:
+    from .coordinator import AquastillaSoftenerCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds the cloud may hold one long-poll request before answering empty.
+LONG_POLL_TIMEOUT = 300
+# Bounds of the exponential backoff between reconnects of a dropped channel.
+RECONNECT_MIN = 5
+RECONNECT_MAX = 300
+
+
+class AquastillaSoftenerUpdateSource(ABC):
+    """A channel telling an account coordinator that devices have new data.
+
+    Polling is built into the coordinator and always runs. A source adds a
+    faster path: it fetches the devices it hears about through
+    ``async_refresh_devices`` and reports through ``async_set_streaming``
+    whether it is connected. While it is, polling is relaxed to a safety net.
+    Once it drops, the coordinator polls adaptively again.
+    """
+
+    def __init__(self, coordinator: "AquastillaSoftenerCoordinator"):
+        self.coordinator = coordinator
+
+    @callback
+    @abstractmethod
+    def async_start(self) -> None:
+        ...
+
+    @callback
+    @abstractmethod
+    def async_stop(self) -> None:
+        ...
+
+
+class AquastillaSoftenerLongPollUpdateSource(AquastillaSoftenerUpdateSource):
+    """Long-poll ``/device/changes`` for the devices of one account.
+
+    One request is held open per account. It returns as soon as any device
+    changes, so a regeneration starting or the valve closing shows up within
+    a round trip, and an idle account costs one request per
+    ``LONG_POLL_TIMEOUT``. Transport errors reconnect with jittered
+    exponential backoff. A cloud without the endpoint, or rejected
+    credentials, stops the source for good and leaves polling in charge.
+    """
+
+    def __init__(
+        self,
+        coordinator: "AquastillaSoftenerCoordinator",
+        timeout: float = LONG_POLL_TIMEOUT,
+    ):
+        super().__init__(coordinator)
+        self._timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+
+    @callback
+    def async_start(self) -> None:
+        if self._task is None:
+            self._task = self.coordinator.hass.async_create_background_task(
+                self._async_run(), "aquastilla_softener long poll"
+            )
+
+    @callback
+    def async_stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.coordinator.async_set_streaming(False)
+
+    async def _async_run(self) -> None:
+        api = self.coordinator.api
+        cursor: Optional[str] = None
+        failures = 0
+        while True:
+            try:
+                changes = await api.wait_for_changes(cursor, self._timeout)
+            except AquastillaSoftenerNotFoundError:
+                _LOGGER.warning(
+                    "The Aquastilla cloud offers no change channel, using polling only"
+                )
+                break
+            except AquastillaSoftenerAuthError as err:
+                _LOGGER.warning("Change channel stopped: %s", err)
+                break
+            except AquastillaSoftenerApiError as err:
+                self.coordinator.async_set_streaming(False)
+                failures += 1
+                delay = min(RECONNECT_MAX, RECONNECT_MIN * 2 ** (failures - 1))
+                delay = random.uniform(delay / 2, delay)
+                if isinstance(err, AquastillaSoftenerRateLimitError) and err.retry_after:
+                    delay = max(delay, err.retry_after)
+                _LOGGER.debug("Change channel dropped (%s), reconnecting in %.0fs", err, delay)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            self.coordinator.async_set_streaming(True)
+            cursor = changes.get("cursor", cursor)
+            if changes.get("devices"):
+                await self.coordinator.async_refresh_devices(changes["devices"])
+        self._task = None
+        self.coordinator.async_set_streaming(False)